@@ -33,10 +33,17 @@ def reload_package(module_dict_main: dict[str, Any]) -> None:
 	reload_package_recursive(Path(__file__).parent, module_dict_main)
 
 
-if 'op' in locals():
-	reload_package(locals())
-else:
-	from io_import_psw import op
+try:
+	import bpy
+except ImportError:
+	# outside of Blender only the parsing modules and the benchmarks are usable.
+	bpy = None
+
+if bpy is not None:
+	if 'op' in locals():
+		reload_package(locals())
+	else:
+		from io_import_psw import op
 
 
 def register():
@@ -0,0 +1,200 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from hashlib import sha1
+from os.path import basename, dirname, join as join_path, normcase, normpath, relpath
+import json
+import os
+import sys
+
+from io_import_psw.utils import get_cache_dir, log_error, log_info, log_warning
+
+index_extensions = ('.uemodel', '.json', '.png')
+index_version = 1
+prefetch_window = 16  # files read ahead of the consumer, bounds the memory held by the prefetcher
+
+
+def get_key(path: str) -> str:
+	# normcase is a no-op on macOS, but its default file systems are case insensitive like Windows.
+	if sys.platform == 'darwin':
+		return normcase(path).lower()
+	return normcase(path)
+
+
+class AssetIndex:
+	root: str
+	files: dict[str, str]  # normalized relative path -> absolute path
+	directories: dict[str, int]  # relative directory -> mtime_ns
+
+	def __init__(self, root: str):
+		self.root = normpath(root)
+		self.files = {}
+		self.directories = {}
+
+	@property
+	def cache_path(self) -> str:
+		return join_path(get_cache_dir(), 'assets-%s.json' % sha1(normcase(self.root).encode('utf8')).hexdigest())
+
+	def add_file(self, relative_path: str):
+		self.files[get_key(relative_path)] = join_path(self.root, relative_path)
+
+	def scan(self):
+		self.files = {}
+		self.directories = {}
+		# symlinked directories are followed, each one only once so cycles can't recurse forever.
+		visited: set[tuple[int, int]] = set()
+		pending = ['']
+		while pending:
+			current = pending.pop()
+			current_path = join_path(self.root, current) if current else self.root
+			try:
+				stat = os.stat(current_path)
+				if (stat.st_dev, stat.st_ino) in visited:
+					continue
+				visited.add((stat.st_dev, stat.st_ino))
+				self.directories[current] = stat.st_mtime_ns
+				entries = list(os.scandir(current_path))
+			except OSError:
+				continue
+			for entry in entries:
+				relative_path = join_path(current, entry.name) if current else entry.name
+				try:
+					is_dir = entry.is_dir()
+				except OSError:
+					continue
+				if is_dir:
+					pending.append(relative_path)
+				elif entry.name.endswith(index_extensions):
+					self.add_file(relative_path)
+
+	def is_valid(self) -> bool:
+		if len(self.directories) == 0:
+			return False
+		for (directory, mtime) in self.directories.items():
+			try:
+				if os.stat(join_path(self.root, directory) if directory else self.root).st_mtime_ns != mtime:
+					return False
+			except OSError:
+				return False
+		return True
+
+	def load(self) -> bool:
+		try:
+			with open(self.cache_path, 'r') as stream:
+				data = json.load(stream)
+		except (OSError, ValueError):
+			return False
+
+		if data.get('version') != index_version or data.get('root') != self.root:
+			return False
+
+		self.files = {}
+		self.directories = data['directories']
+		for relative_path in data['files']:
+			self.add_file(relative_path)
+		return True
+
+	def save(self):
+		data = {
+			'version': index_version,
+			'root': self.root,
+			'directories': self.directories,
+			'files': [relpath(x, self.root) for x in self.files.values()],
+		}
+		try:
+			with open(self.cache_path, 'w') as stream:
+				json.dump(data, stream)
+		except OSError as e:
+			log_warning('ASSETS', 'Could not write asset index cache: %s' % e)
+
+	def refresh(self):
+		if self.is_valid():
+			return
+		if self.load() and self.is_valid():
+			log_info('ASSETS', 'Loaded asset index for %s (%d files)' % (self.root, len(self.files)))
+			return
+		self.scan()
+		log_info('ASSETS', 'Indexed %s (%d files)' % (self.root, len(self.files)))
+		self.save()
+
+	def resolve(self, path: str) -> str | None:
+		return self.files.get(get_key(normpath(path)))
+
+	def find(self, path: str, suffixes: tuple[str, ...]) -> str | None:
+		while True:
+			for suffix in suffixes:
+				result = self.resolve(path + suffix)
+				if result is not None:
+					return result
+
+			# Foo/Bar.Bar -> Foo/Bar
+			name = basename(path)
+			if '.' not in name:
+				return None
+			path = join_path(dirname(path), name[:name.index('.')])
+
+	def find_umodel(self, path: str) -> str | None:
+		return self.find(path, ('.uemodel',))
+
+	def find_material(self, path: str) -> str | None:
+		return self.find(path, ('.json', '.0.json'))
+
+	def find_texture(self, path: str) -> str | None:
+		return self.find(path, ('.png', '.0.png'))
+
+
+indices: dict[str, AssetIndex] = {}
+
+
+def get_asset_index(root: str) -> AssetIndex:
+	key = normcase(normpath(root))
+	if key not in indices:
+		indices[key] = AssetIndex(root)
+	index = indices[key]
+	index.refresh()
+	return index
+
+
+def read_asset(path: str) -> bytes | None:
+	try:
+		with open(path, 'rb') as stream:
+			return stream.read()
+	except OSError as e:
+		log_error('ASSETS', 'Can\'t read %s: %s' % (path, e))
+		return None
+
+
+class AssetPrefetcher:
+	paths: deque[str]  # paths not submitted yet, in the order they will be asked for
+	pending: deque[tuple[str, Future]]
+
+	def __init__(self, paths: list[str], window: int = prefetch_window):
+		self.paths = deque(paths)
+		self.pending = deque()
+		self.window = window
+		self.pool = ThreadPoolExecutor(max_workers=min(window, (os.cpu_count() or 1) + 4)) if len(paths) > 0 else None
+		self.fill()
+
+	def fill(self):
+		while self.paths and len(self.pending) < self.window:
+			path = self.paths.popleft()
+			self.pending.append((path, self.pool.submit(read_asset, path)))
+
+	def get(self, path: str) -> bytes | None:
+		# requests are expected in plan order, entries the consumer skipped are dropped and unplanned paths are read on the spot.
+		if not any(x[0] == path for x in self.pending):
+			return read_asset(path)
+
+		while True:
+			(pending_path, future) = self.pending.popleft()
+			if pending_path == path:
+				break
+			future.cancel()
+		self.fill()
+		return future.result()
+
+	def close(self):
+		if self.pool is not None:
+			self.pool.shutdown(wait=False, cancel_futures=True)
+			self.pool = None
+		self.paths.clear()
+		self.pending.clear()
@@ -0,0 +1,164 @@
+import argparse
+import os
+import tracemalloc
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from io_import_psw.assets import AssetIndex
+from io_import_psw.bench.synth import SynthSettings, actor_versions, write_assets, write_world
+from io_import_psw.io import load_file, read_file
+from io_import_psw import utils
+from io_import_psw.utils import find_root_from_path, logger, root_cache, set_cache_dir
+
+# mirrors the operator defaults that matter to parsing.
+parse_settings = {
+	'resize_by': 0.01,
+	'import_mesh': True,
+	'import_light': True,
+	'import_landscape': True,
+}
+
+
+def best_of(repeat: int, func) -> float:
+	best = None
+	for _ in range(repeat):
+		start = perf_counter()
+		func()
+		elapsed = perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+	return best
+
+
+def measure_parse(path: str, use_mmap: bool, repeat: int) -> dict[str, float]:
+	settings = dict(parse_settings, use_mmap=use_mmap)
+	phases = {'read_file': None, 'finalize': None}
+	for _ in range(repeat):
+		with open(path, 'rb') as stream:
+			ob = read_file(stream, settings)
+		for (name, (seconds, _)) in ob.Profile.phases.items():
+			if name in phases:
+				phases[name] = seconds if phases[name] is None else min(phases[name], seconds)
+	return phases
+
+
+def measure_peak(path: str, use_mmap: bool) -> int:
+	settings = dict(parse_settings, use_mmap=use_mmap)
+	tracemalloc.start()
+	try:
+		with open(path, 'rb') as stream:
+			ob = read_file(stream, settings)
+		(_, peak) = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	del ob
+	return peak
+
+
+def measure_cache(root: str, path: str, repeat: int) -> float:
+	# the cache lives next to the synthetic world so the bench never touches the user's own cache.
+	previous = utils.cache_dir
+	set_cache_dir(os.path.join(root, 'cache'))
+	try:
+		settings = dict(parse_settings, use_parse_cache=True)
+		load_file(path, settings)  # populate
+		return best_of(repeat, lambda: load_file(path, settings))
+	finally:
+		set_cache_dir(previous)
+
+
+def measure_paths(root: str, path: str, settings: SynthSettings, repeat: int) -> dict[str, float]:
+	root_cache.clear()
+	start = perf_counter()
+	find_root_from_path(path)
+	root_cold = perf_counter() - start
+	root_warm = best_of(repeat, lambda: find_root_from_path(path))
+
+	index = AssetIndex(root)
+	scan = best_of(repeat, index.scan)
+
+	with open(path, 'rb') as stream:
+		ob = read_file(stream, dict(parse_settings, import_light=False, import_landscape=False))
+	assets = [x.strip('/') for x in ob.ActorAssets]
+	resolve = best_of(repeat, lambda: [index.find_umodel(x) for x in assets])
+	return {
+		'root cold': root_cold,
+		'root warm': root_warm,
+		'index scan': scan,
+		'resolve per actor': resolve / max(1, len(assets)),
+		'files': len(index.files),
+	}
+
+
+def format_size(size: int) -> str:
+	for unit in ('B', 'KiB', 'MiB'):
+		if size < 1024:
+			return '%.1f %s' % (size, unit)
+		size /= 1024
+	return '%.1f GiB' % size
+
+
+def run(args: argparse.Namespace) -> list[str]:
+	lines = []
+
+	def emit(line: str):
+		print(line)
+		lines.append(line)
+
+	for version in args.versions:
+		for actors in args.sizes:
+			for unique_ratio in args.unique:
+				settings = SynthSettings(actors=actors, actor_version=version, material_version=actor_versions[version], unique_ratio=unique_ratio, seed=args.seed)
+				with TemporaryDirectory(prefix='psw-bench-') as root:
+					path = os.path.join(root, 'Maps', 'Bench.psw')
+					os.makedirs(os.path.dirname(path))
+					write_world(path, settings)
+					size = os.path.getsize(path)
+
+					emit('%s actors=%d unique=%.3f file=%s' % (version, actors, unique_ratio, format_size(size)))
+					for use_mmap in (True, False):
+						phases = measure_parse(path, use_mmap, args.repeat)
+						peak = measure_peak(path, use_mmap)
+						emit('  %-6s read %8.2f ms (%7.1f MiB/s)  finalize %8.2f ms (%9.0f actors/s)  peak %s' % (
+							'mmap' if use_mmap else 'stream',
+							phases['read_file'] * 1000,
+							size / (1024 * 1024) / max(phases['read_file'], 1e-9),
+							phases['finalize'] * 1000,
+							actors / max(phases['finalize'], 1e-9),
+							format_size(peak)))
+
+					if not args.no_cache:
+						emit('  cache  load %8.2f ms' % (measure_cache(root, path, args.repeat) * 1000))
+
+					if settings.unique_assets <= args.max_files:
+						write_assets(root, settings)
+						paths = measure_paths(root, path, settings, args.repeat)
+						emit('  paths  root %.3f ms cold, %.4f ms warm  scan %.2f ms (%d files)  resolve %.2f us/actor' % (
+							paths['root cold'] * 1000,
+							paths['root warm'] * 1000,
+							paths['index scan'] * 1000,
+							paths['files'],
+							paths['resolve per actor'] * 1000000))
+	return lines
+
+
+def main():
+	parser = argparse.ArgumentParser(prog='python -m io_import_psw.bench', description='Parse synthetic .psw worlds and report throughput, peak memory and path resolution cost.')
+	parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='actor counts, up to 1000000')
+	parser.add_argument('--versions', nargs='+', default=list(actor_versions), choices=actor_versions, help='actor chunk versions')
+	parser.add_argument('--unique', type=float, nargs='+', default=[0.01, 0.1, 1.0], help='distinct assets per actor')
+	parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the best is reported')
+	parser.add_argument('--max-files', type=int, default=20000, help='skip path resolution when more asset files than this would be written')
+	parser.add_argument('--no-cache', action='store_true', help='skip the parse cache measurement')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--output', help='also write the report to this file')
+	args = parser.parse_args()
+
+	logger.configure('ERROR')
+	lines = run(args)
+	if args.output is not None:
+		with open(args.output, 'w', encoding='utf8') as stream:
+			stream.write('\n'.join(lines) + '\n')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,160 @@
+import os
+import typing
+from struct import pack
+
+import numpy
+from numpy import ndarray
+
+from io_import_psw.io import ChunkParser, dispatch
+
+# actor layout -> the instance material layout exported alongside it, ::3 carries ACTORMATERIALS instead.
+actor_versions = {
+	'WORLDACTORS': 'INSTMATERIAL',
+	'WORLDACTORS::2': 'INSTMATERIAL::2',
+	'WORLDACTORS::3': None,
+}
+
+
+class SynthSettings(typing.NamedTuple):
+	actors: int = 1000
+	actor_version: str = 'WORLDACTORS::3'
+	unique_ratio: float = 0.1  # distinct assets per actor, 1.0 = nothing is reused
+	materials_per_actor: int = 2
+	light_ratio: float = 0.05
+	parent_ratio: float = 0.1
+	landscape_tiles: int = 4
+	landscape_layers: int = 2
+	material_version: str | None = None
+	seed: int = 0
+
+	@property
+	def unique_assets(self) -> int:
+		return max(1, int(self.actors * self.unique_ratio))
+
+
+def get_asset_path(asset_id: int) -> str:
+	return '/Game/Bench/Group%03d/SM_Bench%06d.SM_Bench%06d' % (asset_id % 256, asset_id, asset_id)
+
+
+def get_material_path(material_id: int) -> str:
+	return '/Game/Bench/Materials/MI_Bench%05d.MI_Bench%05d' % (material_id, material_id)
+
+
+def get_texture_path(x: int, y: int, layer: int) -> str:
+	return '/Game/Bench/Landscape/Tile_%d_%d_%d' % (x, y, layer)
+
+
+def set_strings(column: ndarray, table: list[str], index: ndarray):
+	width = column.shape[1]
+	encoded = numpy.array([x.encode('utf8')[:width] for x in table], dtype='S%d' % width)
+	column[:] = encoded[index].view(numpy.int8).reshape(-1, width)
+
+
+def make_chunk(chunk_id: str, count: int) -> tuple[ChunkParser, ndarray]:
+	parser = dispatch[chunk_id]
+	return (parser, numpy.zeros(count, dtype=parser.dtype))
+
+
+def make_actors(settings: SynthSettings, rng: numpy.random.Generator) -> tuple[ndarray, ndarray | None]:
+	(parser, actors) = make_chunk(settings.actor_version, settings.actors)
+	set_strings(actors['name'], ['BenchActor_%d' % x for x in range(settings.actors)], numpy.arange(settings.actors))
+
+	assets = rng.integers(0, settings.unique_assets, settings.actors)
+	set_strings(actors['asset'], [get_asset_path(x) for x in range(settings.unique_assets)], assets)
+
+	# parents always point backwards so the hierarchy has no cycles.
+	parents = numpy.full(settings.actors, -1, dtype=numpy.int32)
+	children = rng.random(settings.actors) < settings.parent_ratio
+	children[0] = False
+	parents[children] = (rng.random(numpy.count_nonzero(children)) * numpy.nonzero(children)[0]).astype(numpy.int32)
+	actors['parent'] = parents
+
+	actors['pos'] = rng.uniform(-100000, 100000, (settings.actors, 3))
+	rotations = rng.normal(size=(settings.actors, 4))
+	actors['rot'] = rotations / numpy.linalg.norm(rotations, axis=1, keepdims=True)
+	actors['scale'] = rng.uniform(0.5, 2.0, (settings.actors, 3))
+	actors['flags'] = rng.integers(0, 16, settings.actors) & rng.integers(0, 16, settings.actors)
+
+	if 'material_start' not in parser.dtype.names:
+		return (actors, None)
+
+	(_, materials) = make_chunk('ACTORMATERIALS', settings.actors * settings.materials_per_actor)
+	unique_materials = max(1, settings.unique_assets * settings.materials_per_actor)
+	material_ids = (assets[:, None] * settings.materials_per_actor + numpy.arange(settings.materials_per_actor)) % unique_materials
+	set_strings(materials['name'], ['MI_Bench%05d' % x for x in range(unique_materials)], material_ids.reshape(-1))
+	set_strings(materials['asset'], [get_material_path(x) for x in range(unique_materials)], material_ids.reshape(-1))
+	actors['material_start'] = numpy.arange(settings.actors) * settings.materials_per_actor
+	actors['material_len'] = settings.materials_per_actor
+	return (actors, materials)
+
+
+def make_lights(settings: SynthSettings, rng: numpy.random.Generator) -> ndarray:
+	count = int(settings.actors * settings.light_ratio)
+	(_, lights) = make_chunk('WORLDLIGHTS', count)
+	lights['parent'] = rng.integers(0, settings.actors, count)
+	lights['color'] = rng.integers(0, 256, (count, 4))
+	lights['type'] = rng.integers(0, 4, count)
+	lights['whl'] = rng.uniform(10, 1000, (count, 3))
+	lights['attenuation'] = rng.uniform(100, 10000, count)
+	lights['radius'] = rng.uniform(1, 100, count)
+	lights['temp'] = rng.uniform(1700, 12000, count)
+	lights['bias'] = rng.uniform(0, 1, count)
+	lights['lumens'] = rng.uniform(0, 10000, count)
+	lights['angle'] = rng.uniform(0.1, 1.5, count)
+	return lights
+
+
+def make_landscapes(settings: SynthSettings, rng: numpy.random.Generator) -> ndarray:
+	count = settings.landscape_tiles * (settings.landscape_layers + 1)
+	(_, landscapes) = make_chunk('LANDSCAPE', count)
+	side = int(numpy.ceil(numpy.sqrt(settings.landscape_tiles)))
+	tiles = [(x % side, x // side) for x in range(settings.landscape_tiles) for _ in range(settings.landscape_layers + 1)]
+	layers = [x % (settings.landscape_layers + 1) for x in range(count)]
+	set_strings(landscapes['name'], [get_texture_path(x, y, layer) for ((x, y), layer) in zip(tiles, layers)], numpy.arange(count))
+	landscapes['actor_id'] = rng.integers(0, settings.actors, count)
+	landscapes['x'] = [x for (x, _) in tiles]
+	landscapes['y'] = [y for (_, y) in tiles]
+	landscapes['type'] = layers
+	landscapes['size'] = 127
+	landscapes['bias'] = rng.integers(-1000, 1000, count)
+	landscapes['dim'] = 1
+	return landscapes
+
+
+def make_instance_materials(settings: SynthSettings, rng: numpy.random.Generator) -> ndarray:
+	(_, entries) = make_chunk(settings.material_version, settings.actors)
+	entries['actor_id'] = numpy.arange(settings.actors)
+	entries['material_id'] = rng.integers(0, settings.materials_per_actor or 1, settings.actors)
+	set_strings(entries['name'], ['MI_Bench%05d' % x for x in range(settings.unique_assets)], rng.integers(0, settings.unique_assets, settings.actors))
+	return entries
+
+
+def write_chunk(stream: typing.BinaryIO, chunk_id: str, data: ndarray | None):
+	if data is None:
+		return
+	stream.write(pack('20s3i', chunk_id.encode('utf8'), 0, data.dtype.itemsize, len(data)))
+	stream.write(data.tobytes())
+
+
+def write_world(path: str, settings: SynthSettings):
+	rng = numpy.random.default_rng(settings.seed)
+	(actors, materials) = make_actors(settings, rng)
+	with open(path, 'wb') as stream:
+		stream.write(pack('20s3i', b'WRLDHEAD', 0, 0, 0))
+		write_chunk(stream, settings.actor_version, actors)
+		write_chunk(stream, 'ACTORMATERIALS', materials)
+		if settings.material_version is not None:
+			write_chunk(stream, settings.material_version, make_instance_materials(settings, rng))
+		write_chunk(stream, 'WORLDLIGHTS', make_lights(settings, rng))
+		if settings.landscape_tiles > 0:
+			write_chunk(stream, 'LANDSCAPE', make_landscapes(settings, rng))
+
+
+def write_assets(root: str, settings: SynthSettings):
+	with open(os.path.join(root, 'Bench.root'), 'wb'):
+		pass
+	for asset_id in range(settings.unique_assets):
+		path = os.path.join(root, *get_asset_path(asset_id).strip('/').split('.')[0].split('/')) + '.uemodel'
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, 'wb'):
+			pass
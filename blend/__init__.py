@@ -1,3 +1,4 @@
+from io_import_psw.blend import adapter
 from io_import_psw.blend import nodes
 from io_import_psw.blend import psw
 from io_import_psw.blend import mat
@@ -0,0 +1,15 @@
+from mathutils import Color, Quaternion, Vector
+
+from io_import_psw.io import World
+
+
+def get_actors(world: World) -> list[tuple[str, str, int, Vector, Quaternion, Vector, bool, bool, bool, bool, int, int]]:  # bools = no shadow, hidden, use_temp, is_static
+	return [(name, asset, int(parent), Vector(pos), Quaternion(rot), Vector(scale), bool(no_shadow), bool(hidden), bool(use_temp), bool(is_static), int(material_start), int(material_len)) for (name, asset, parent, pos, rot, scale, no_shadow, hidden, use_temp, is_static, material_start, material_len) in zip(world.ActorNames, world.ActorAssets, world.ActorParents.tolist(), world.ActorPositions.tolist(), world.ActorRotations.tolist(), world.ActorScales.tolist(), world.ActorNoShadow.tolist(), world.ActorHidden.tolist(), world.ActorUseTemp.tolist(), world.ActorIsStatic.tolist(), world.ActorMaterialStart.tolist(), world.ActorMaterialLen.tolist())]
+
+
+def get_lights(world: World) -> list[tuple[int, Color, int, Vector, float, float, float, float, float, float]]:
+	return [(actor, Color(color), light_type, Vector(whl), attenuation, radius, temp, bias, lumens, angle) for (actor, color, light_type, whl, attenuation, radius, temp, bias, lumens, angle) in zip(world.LightActors.tolist(), world.LightColors.tolist(), world.LightTypes.tolist(), world.LightSizes.tolist(), world.LightAttenuation.tolist(), world.LightRadius.tolist(), world.LightTemperature.tolist(), world.LightBias.tolist(), world.LightLumens.tolist(), world.LightAngle.tolist())]
+
+
+def get_landscapes(world: World) -> list[tuple[str, int, Vector, int, int, int, int, int, Vector, Vector]]:  # name, actor, pos, size, type, x, y, bias, offset, dim
+	return [(name, actor, Vector((x, -y, 0)), size, type_id, x, y, bias, Vector((offset[0], offset[1], 0.0)), Vector((dim[0], dim[1], 1.0))) for (name, actor, (x, y), size, type_id, bias, offset, dim) in zip(world.LandscapeNames, world.LandscapeActors.tolist(), world.LandscapeTiles.tolist(), world.LandscapeSizes.tolist(), world.LandscapeTypes.tolist(), world.LandscapeBias.tolist(), world.LandscapeOffsets.tolist(), world.LandscapeDims.tolist())]
@@ -1,38 +1,122 @@
 import bpy
 from bpy.types import Material,  Property, Context
-from os.path import basename, dirname, sep, normpath, exists
-from os.path import join as join_path
+from concurrent.futures import ThreadPoolExecutor
+from os.path import basename, normcase, normpath, sep
+from typing import Iterable
 import json
+import os
+
+from io_import_psw.assets import AssetIndex, get_asset_index
+from io_import_psw.utils import get_profiler, log_error
+
+class MaterialCache:
+	entries: dict[str, tuple[int, int, str]]  # json path -> (mtime, size, material name)
+	hits: int
+	misses: int
+
+	def __init__(self):
+		self.entries = {}
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def get_key(path: str) -> str:
+		return normcase(normpath(path))
+
+	@staticmethod
+	def get_stamp(path: str) -> tuple[int, int] | None:
+		try:
+			stat = os.stat(path)
+		except OSError:
+			return None
+		return (stat.st_mtime_ns, stat.st_size)
+
+	def peek(self, path: str) -> Material | None:
+		key = self.get_key(path)
+		entry = self.entries.get(key)
+		if entry is not None:
+			mat = bpy.data.materials.get(entry[2])
+			if mat is not None and mat.get('psw_source') == key and self.get_stamp(path) == entry[:2]:
+				return mat
+			del self.entries[key]
+		return None
+
+	def get(self, path: str) -> Material | None:
+		mat = self.peek(path)
+		if mat is not None:
+			self.hits += 1
+		else:
+			self.misses += 1
+		return mat
+
+	def put(self, path: str, mat: Material):
+		stamp = self.get_stamp(path)
+		if stamp is None:
+			return
+
+		key = self.get_key(path)
+		mat['psw_source'] = key
+		self.entries[key] = (stamp[0], stamp[1], mat.name)
+
+	def invalidate(self, path: str | None = None):
+		if path is None:
+			self.entries.clear()
+		else:
+			self.entries.pop(self.get_key(path), None)
+
+
+material_cache = MaterialCache()
+
+
+def import_cached_material(path: str, settings: dict[str, Property], assets: AssetIndex | None = None, material_data: dict | None = None) -> Material | None:
+	mat = material_cache.get(path)
+	if mat is None:
+		with get_profiler().phase('material build'):
+			mat = CUEMaterial(path, settings, assets, material_data).import_material()
+	return mat
+
+
+def load_material_data(path: str) -> dict | None:
+	try:
+		with open(path, 'r') as stream:
+			return json.load(stream)
+	except (OSError, ValueError) as e:
+		log_error('MATERIAL', 'Can\'t read material %s: %s' % (path, e))
+		return None
+
+
+def preload_materials(paths: Iterable[str]) -> dict[str, dict | None]:
+	paths = [x for x in set(paths) if material_cache.peek(x) is None]
+	if len(paths) == 0:
+		return {}
+
+	# threads rather than processes, the time goes to waiting on the disk and the parsed dicts don't need pickling.
+	with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4)) as pool:
+		return dict(zip(paths, pool.map(load_material_data, paths)))
+
 
 class CUEMaterial:
 	path: str
 	settings: dict[str, Property]
 	game_dir: str
+	assets: AssetIndex
 	material_data: dict
 
-	def __init__(self, path: str, settings: dict[str, Property]):
+	def __init__(self, path: str, settings: dict[str, Property], assets: AssetIndex | None = None, material_data: dict | None = None):
 		self.path = path
 		self.settings = settings
 		self.game_dir = self.settings['base_game_dir']
+		self.assets = assets if assets is not None else get_asset_index(self.game_dir)
 
-		with open(self.path, 'r') as stream:
-			self.material_data = json.load(stream)
+		if material_data is not None:
+			self.material_data = material_data
+		else:
+			with open(self.path, 'r') as stream:
+				self.material_data = json.load(stream)
 
 
 	def try_find_texture(self, path: str) -> str or None:
-		png_path = normpath(join_path(self.game_dir, path + '.png'))
-		if exists(png_path):
-			return png_path
-
-		png_path = normpath(join_path(self.game_dir, path + '.0.png'))
-		if exists(png_path):
-			return png_path
-
-		name = basename(path)
-		if not '.' in name:
-			return None
-
-		return self.try_find_texture(join_path(dirname(path), name[:name.index('.')]))
+		return self.assets.find_texture(path)
 
 
 	def execute(self, context: Context) -> set[str]:
@@ -201,5 +285,7 @@ class CUEMaterial:
 				mat.node_tree.links.new(value_node.outputs[0], group_node.inputs[alpha_node_name])
 			y -= height
 
+		material_cache.put(self.path, mat)
+
 		return mat
 
@@ -1,14 +1,17 @@
-from os.path import basename, dirname, splitext, sep, normpath, exists
-from os.path import join as join_path
+from os.path import basename, sep
+from typing import Callable, Generator
 
 import numpy
 import bpy.types
+from numpy import ndarray
 import io_import_psw.utils as utils
-from bpy.types import Property, Context, Collection, Mesh, Object, NodesModifier, GeometryNodeTree, NodeGroupOutput, GeometryNodeGroup, Image, Material, ShaderNodeTexCoord, ShaderNodeSeparateXYZ, NodeReroute, ShaderNodeTexImage
-from mathutils import Quaternion, Vector, Color
-from io_import_psw.io import read_file, World
-from io_import_psw.blend.mat import CUEMaterial
-from io_import_psw.utils import log_error, log_warning, log_info
+from bpy.types import Property, Context, Collection, Light, Mesh, Object, NodesModifier, GeometryNodeTree, NodeGroupInput, NodeGroupOutput, GeometryNodeGroup, GeometryNodeCollectionInfo, GeometryNodeInputNamedAttribute, GeometryNodeInstanceOnPoints, Image, Material, ShaderNodeTexCoord, ShaderNodeSeparateXYZ, NodeReroute, ShaderNodeTexImage
+from mathutils import Vector, Color
+from io_import_psw.io import load_file, World
+from io_import_psw.blend.adapter import get_landscapes
+from io_import_psw.assets import AssetIndex, AssetPrefetcher, get_asset_index
+from io_import_psw.blend.mat import import_cached_material, material_cache, preload_materials
+from io_import_psw.utils import logger, log_count, log_error, log_warning, log_info, log_summary, Profiler, set_profiler
 
 enable_ueformat = False
 try:
@@ -20,10 +23,21 @@ except:
 	log_error('WORLD', "failed to load ue_format")
 	pass
 
+instance_batch_size = 4096
+
+light_type_names = ('SUN', 'POINT', 'SPOT', 'AREA')  # indexed by the psw light type
+light_rotation = (0.707107, 0, -0.707107, 0)
+light_precision = 0.001  # parameters closer than this are considered identical when sharing light data
+height_grid_density = 32  # grid vertices per tile and dimension, the same as the Grid node in 'PSW Height'
+
 ignore_names = ['CUBE', 'SPHERE', 'CONE', 'CYLINDER', 'CAPSULE', 'BOX', 'ARROW', 'SPLINE', 'PLANE']
 
 
-def is_ignored_name(path: str) -> bool:
+def parse_ignore_names(names: str) -> list[str]:
+	return [x.strip().upper() for x in names.split(',') if len(x.strip()) > 0]
+
+
+def is_ignored_name(path: str, names: list[str] = ignore_names) -> bool:
 	test = basename(path).split('.')[0].upper()
 	if test.startswith('SM_'):
 		test = test[3:]
@@ -32,7 +46,7 @@ def is_ignored_name(path: str) -> bool:
 	elif test.startswith('1M_'):
 		test = test[3:].split('_')[0]
 	if 'VFX_' in test: return True
-	return test in ignore_names
+	return test in names
 
 
 def is_lodactor_or_hlod(path: str) -> bool:
@@ -40,29 +54,80 @@ def is_lodactor_or_hlod(path: str) -> bool:
 	return 'LODACTOR_' in test or '_HLOD_' in test
 
 
+def get_name_mask(table: list[str], test: Callable[[str], bool]) -> ndarray:
+	return numpy.array([test(x) for x in table], dtype=bool)
+
+
+def convert_temperatures(temperatures: ndarray) -> ndarray:
+	temperature = numpy.clip(numpy.asarray(temperatures, dtype=numpy.float64), 1000, 40000) / 100.0
+
+	# both sides of every branch are evaluated, the clamped operands keep the unused side finite.
+	warm = temperature <= 66
+	hot = numpy.maximum(temperature - 60, 1)
+	red = numpy.where(warm, 255, 329.698727446 * hot**-0.1332047592)
+	green = numpy.where(warm, 99.4708025861 * numpy.log(temperature) - 161.1195681661, 288.1221695283 * hot**-0.0755148492)
+	blue = numpy.where(temperature >= 66, 255, numpy.where(temperature <= 19, 0, 138.5177312231 * numpy.log(numpy.maximum(temperature - 10, 1)) - 305.0447927307))
+
+	return (numpy.clip(numpy.stack((red, green, blue), axis=-1), 0, 255) / 255).astype(numpy.float32)
+
+
 def convert_temperature(temperature: float) -> Color:
-	temperature = numpy.clip(temperature, 1000, 40000)
-	temperature = temperature / 100.0
+	return Color(convert_temperatures(numpy.array([temperature]))[0].tolist())
+
+
+def quaternion_to_euler(rotations: ndarray) -> ndarray:
+	(w, x, y, z) = rotations.astype(numpy.float64).T
+	roll = numpy.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+	pitch = numpy.arcsin(numpy.clip(2 * (w * y - z * x), -1, 1))
+	yaw = numpy.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+	return numpy.stack((roll, pitch, yaw), axis=1).astype(numpy.float32)
+
+
+def get_cubic_weights(coords: ndarray, size: int) -> ndarray:
+	# cubic b-spline taps with clamped edges, the lookup 'PSW Height' gets from its cubic/extend image texture node.
+	texel = coords * size - 0.5
+	base = numpy.floor(texel)
+	t = texel - base
+	taps = (
+		(1 - t)**3 / 6,
+		(3 * t**3 - 6 * t**2 + 4) / 6,
+		(-3 * t**3 + 3 * t**2 + 3 * t + 1) / 6,
+		t**3 / 6)
+	weights = numpy.zeros((len(coords), size))
+	rows = numpy.arange(len(coords))
+	for (offset, tap) in enumerate(taps):
+		numpy.add.at(weights, (rows, numpy.clip(base.astype(numpy.int64) + offset - 1, 0, size - 1)), tap)
+	return weights
+
+
+def bake_heightmap(heightmap: ndarray, vertices_x: int, vertices_y: int) -> ndarray:
+	# a unit grid around the origin laid out like the Grid node (x * vertices_y + y), displaced by (h - 0.5) * 2.
+	xs = numpy.linspace(-0.5, 0.5, vertices_x)
+	ys = numpy.linspace(-0.5, 0.5, vertices_y)
+	(height, width) = heightmap.shape
+	heights = get_cubic_weights(ys + 0.5, height) @ heightmap @ get_cubic_weights(xs + 0.5, width).T
+	co = numpy.empty((vertices_x, vertices_y, 3), dtype=numpy.float32)
+	co[:, :, 0] = xs[:, None]
+	co[:, :, 1] = ys[None, :]
+	co[:, :, 2] = (heights.T - 0.5) * 2
+	return co.reshape(-1, 3)
+
 
-	if temperature <= 66:
-		red = 255
-	else:
-		red = 329.698727446 * (temperature - 60)**-0.1332047592
+def get_grid_loops(vertices_x: int, vertices_y: int) -> ndarray:
+	index = numpy.arange(vertices_x * vertices_y, dtype=numpy.int32).reshape(vertices_x, vertices_y)
+	return numpy.stack((index[:-1, :-1], index[1:, :-1], index[1:, 1:], index[:-1, 1:]), axis=-1).reshape(-1)
 
-	if temperature <= 66:
-		green = 99.4708025861 * numpy.log(temperature) - 161.1195681661
-	else:
-		green = 288.1221695283 * (temperature - 60)**-0.0755148492
 
-	if temperature >= 66:
-		blue = 255
-	elif temperature <= 19:
-		blue = 0
-	else:
-		blue = 138.5177312231 * numpy.log(temperature - 10) - 305.0447927307
+def load_world(path: str, settings: dict[str, Property]) -> World | None:
+	return load_file(path, settings)
 
-	rgb = numpy.clip((red, green, blue), 0, 255) / 255
-	return Color((rgb[0], rgb[1], rgb[2]))
+
+def import_model(import_settings: 'UEModelOptions', path: str, data: bytes | None) -> Object | None:
+	importer = UEFormatImport(import_settings)
+	# older UEFormat releases only take a path, the prefetched read then just left the file in the page cache.
+	if data is not None and hasattr(importer, 'import_data'):
+		return importer.import_data(data)
+	return importer.import_file(path)
 
 
 def undeduplicate_name(name: str) -> str:
@@ -84,11 +149,22 @@ class World:
 	no_static_instances: bool
 	no_skeletons: bool
 	ignore_shapes: bool
+	ignore_names: list[str]
+	instance_mode: str
+	share_light_data: bool
+	landscape_mode: str
+	log_level: str
+	write_log: bool
+	write_profile: bool
 	game_dir: str
+	assets: AssetIndex | None
 	psw: World | None
 	name: str
+	steps_done: int
+	steps_total: int
+	datablock_counts: dict[str, int]
 
-	def __init__(self, path: str, settings: dict[str, Property]):
+	def __init__(self, path: str, settings: dict[str, Property], psw: World | None = None):
 		self.path = path
 		self.name = basename(path)
 		if '.' in self.name: self.name = self.name[:self.name.index('.')]
@@ -108,46 +184,383 @@ class World:
 		self.import_light = self.settings['import_light']
 		self.ignore_shapes = self.settings['ignore_shapes']
 		self.ignore_lodactors = self.settings['ignore_lodactors']
-
-		with open(self.path, 'rb') as stream:
-			self.psw = read_file(stream, settings)
+		self.ignore_names = parse_ignore_names(self.settings['ignore_names']) if 'ignore_names' in self.settings else ignore_names
+		self.instance_mode = self.settings.get('instance_mode', 'OBJECT')
+		self.share_light_data = self.settings.get('share_light_data', False)
+		self.landscape_mode = self.settings.get('landscape_mode', 'NODES')
+		self.log_level = self.settings.get('log_level', 'INFO')
+		self.write_log = self.settings.get('write_log', False)
+		self.write_profile = self.settings.get('write_profile', False)
+		self.assets = None
+		self.steps_done = 0
+		self.steps_total = 0
+		self.datablock_counts = {}
+
+		self.psw = psw if psw is not None else load_world(self.path, settings)
 
 	def try_find_material(self, path):
-		json_path = normpath(join_path(self.game_dir, path + '.json'))
-		if exists(json_path):
-			return json_path
-
-		json_path = normpath(join_path(self.game_dir, path + '.0.json'))
-		if exists(json_path):
-			return json_path
-
-		name = basename(path)
-		if not '.' in name:
-			return None
+		return self.assets.find_material(path)
 
-		return self.try_find_umodel(join_path(dirname(path), name[:name.index('.')]))
+	def resolve_material(self, material_path: str) -> str | None:
+		result_material_path = material_path.strip('/').strip('\\')
+		if sep != '/':
+			result_material_path = result_material_path.replace('/', sep)
+		return self.try_find_material(result_material_path)
 
 	def try_find_umodel(self, path):
-		umodel_path = normpath(join_path(self.game_dir, path + '.uemodel'))
-		if exists(umodel_path):
-			return umodel_path
+		return self.assets.find_umodel(path)
+
+	def plan_meshes(self, selected: list[bool], skipped: ndarray) -> list[tuple[str, frozenset] | None]:
+		psw = self.psw
+		asset_index = psw.ActorAssetIndex
+		loads = numpy.array(selected, dtype=bool) & ~skipped
+		if not self.import_mesh:
+			loads[:] = False
+
+		# every distinct asset is resolved once, only the ones a loaded actor actually uses.
+		used = numpy.zeros(len(psw.ActorAssetTable), dtype=bool)
+		used[asset_index[loads]] = True
+		model_paths: list[str | None] = [None] * len(psw.ActorAssetTable)
+		for asset_id in numpy.flatnonzero(used).tolist():
+			game_path = psw.ActorAssetTable[asset_id]
+			if game_path == 'None':
+				continue
+
+			result_path = game_path.strip('/').strip('\\')
+			if sep != '/':
+				result_path = result_path.replace('/', sep)
+
+			if enable_ueformat:
+				model_paths[asset_id] = self.try_find_umodel(result_path)
+			if model_paths[asset_id] is None:
+				log_error('WORLD', 'Can\'t find asset %s' % result_path)
+				log_count('WORLD', 'actors with missing assets', int(numpy.count_nonzero(loads & (asset_index == asset_id))))
+
+		material_names = psw.MaterialNames
+		mesh_keys: list[tuple[str, frozenset] | None] = [None] * psw.NumActors
+		groups: dict[tuple[str, frozenset], int] = {}
+		actor_columns = zip(numpy.flatnonzero(loads).tolist(), asset_index[loads].tolist(), psw.ActorMaterialStart[loads].tolist(), psw.ActorMaterialLen[loads].tolist())
+		for (actor_id, asset_id, material_start, material_len) in actor_columns:
+			model_path = model_paths[asset_id]
+			if model_path is None:
+				continue
+			mesh_key = (model_path, frozenset(material_names[material_start:material_start+material_len]))
+			mesh_keys[actor_id] = mesh_key
+			groups[mesh_key] = groups.get(mesh_key, 0) + 1
+
+		if len(groups) > 0:
+			counts = sorted(groups.values(), reverse=True)
+			log_info('WORLD', 'mesh plan: %d actors share %d unique meshes, %.1f actors per mesh on average, %d at most' % (sum(counts), len(counts), sum(counts) / len(counts), counts[0]))
+			log_count('WORLD', 'unique meshes', len(counts))
+		return mesh_keys
+
+	def get_light_parameters(self) -> dict[str, ndarray]:
+		psw = self.psw
+		light_types = psw.LightTypes
+		actors = psw.LightActors
+		use_temp = psw.ActorUseTemp[actors]
+
+		# unknown light types stay point lights with the default energy and no collection, as they always have.
+		known = (light_types >= 0) & (light_types < len(light_type_names))
+		kinds = numpy.where(known, light_types, 1)
+		multipliers = numpy.array((self.adjust_sun_intensity, self.adjust_intensity, self.adjust_spot_intensity, self.adjust_area_intensity), dtype=numpy.float32)[kinds]
+		lumens = numpy.where(use_temp, psw.LightLumens * 100, psw.LightLumens)
+
+		colors = psw.LightColors.copy()
+		if use_temp.any():
+			colors[use_temp] = convert_temperatures(psw.LightTemperature[use_temp])
+
+		return {
+			'actors': actors,
+			'kinds': kinds,
+			'known': known,
+			'enabled': ~known | (multipliers > 0.0001),
+			'use_shadow': ~psw.ActorNoShadow[actors],
+			'colors': colors,
+			'energy': lumens * multipliers,
+			'soft_size': psw.LightBias,
+			'spot_size': psw.LightAngle,
+			'sizes': psw.LightSizes[:, :2],
+		}
+
+	@staticmethod
+	def get_light_groups(lights: dict[str, ndarray]) -> ndarray:
+		kinds = lights['kinds']
+		# parameters a light type doesn't use are zeroed so they can't split otherwise identical lights.
+		keys = numpy.column_stack((
+			kinds,
+			lights['known'],
+			lights['use_shadow'],
+			lights['colors'],
+			numpy.where(lights['known'], lights['energy'], 0),
+			lights['soft_size'],
+			numpy.where(kinds == 2, lights['spot_size'], 0),
+			numpy.where((kinds == 3)[:, None], lights['sizes'], 0)))
+		(_, groups) = numpy.unique(numpy.round(keys / light_precision).astype(numpy.int64), axis=0, return_inverse=True)
+		return groups.reshape(-1)
+
+	@staticmethod
+	def load_heightmap(path: str) -> ndarray:
+		img: Image = bpy.data.images.load(filepath=path, check_existing=True)
+		img.colorspace_settings.name = 'Non-Color'
+		(width, height) = img.size
+		pixels = numpy.empty(width * height * 4, dtype=numpy.float32)
+		img.pixels.foreach_get(pixels)
+		if img.users == 0:
+			bpy.data.images.remove(img)
+		# 'PSW Height' reads the height from the alpha channel.
+		return pixels[3::4].reshape(height, width)
+
+	@staticmethod
+	def fill_grid_mesh(mesh: Mesh, co: ndarray, vertices_x: int, vertices_y: int):
+		loops = get_grid_loops(vertices_x, vertices_y)
+		face_count = len(loops) // 4
+		mesh.vertices.add(len(co))
+		mesh.vertices.foreach_set('co', co.ravel())
+		mesh.loops.add(len(loops))
+		mesh.loops.foreach_set('vertex_index', loops)
+		mesh.polygons.add(face_count)
+		mesh.polygons.foreach_set('loop_start', numpy.arange(0, len(loops), 4, dtype=numpy.int32))
+		if not bpy.types.MeshPolygon.bl_rna.properties['loop_total'].is_readonly:
+			mesh.polygons.foreach_set('loop_total', numpy.full(face_count, 4, dtype=numpy.int32))
+		mesh.polygons.foreach_set('use_smooth', numpy.ones(face_count, dtype=bool))
+		mesh.update()
+
+	def get_import_order(self, mesh_keys: list[tuple[str, frozenset] | None]) -> list[str]:
+		# mirrors the actor loop, every key is imported once and static and non-static actors copy from that import.
+		seen: set[tuple[str, frozenset]] = set()
+		order = []
+		for mesh_key in mesh_keys:
+			if mesh_key is None:
+				continue
+			if mesh_key not in seen:
+				seen.add(mesh_key)
+				order.append(mesh_key[0])
+		return order
+
+	@staticmethod
+	def duplicate_object(source: Object, collection: Collection) -> Object:
+		# copies share their data with the source, children are copied too so skeletal meshes keep their armature.
+		copies: dict[Object, Object] = {}
+		pending = [source]
+		while pending:
+			original = pending.pop()
+			copy = original.copy()
+			copies[original] = copy
+			collection.objects.link(copy)
+			pending.extend(original.children)
+
+		for (original, copy) in copies.items():
+			if original.parent in copies:
+				copy.parent = copies[original.parent]
+			for modifier in copy.modifiers:
+				target = getattr(modifier, 'object', None)
+				if target in copies:
+					modifier.object = copies[target]
+		return copies[source]
+
+	def create_point_instancer(self, mesh_obj: Collection, positions: ndarray, rotations: ndarray, scales: ndarray) -> Object:
+		name = undeduplicate_name(mesh_obj.name) + ' Instances'
+		points: Mesh = bpy.data.meshes.new(name)
+		points.vertices.add(len(positions))
+		points.vertices.foreach_set('co', positions.astype(numpy.float32).ravel())
+		points.attributes.new('psw_rotation', 'FLOAT_VECTOR', 'POINT').data.foreach_set('vector', rotations.astype(numpy.float32).ravel())
+		points.attributes.new('psw_scale', 'FLOAT_VECTOR', 'POINT').data.foreach_set('vector', scales.astype(numpy.float32).ravel())
+		points.update()
+
+		instance_nodes: GeometryNodeTree = bpy.data.node_groups.new(name, 'GeometryNodeTree')
+		if hasattr(instance_nodes, 'outputs'):
+			instance_nodes.inputs.new('NodeSocketGeometry', 'Geometry')
+			instance_nodes.outputs.new('NodeSocketGeometry', 'Geometry')
+		elif hasattr(instance_nodes, 'interface'):
+			instance_nodes.interface.new_socket('Geometry', in_out='INPUT', socket_type='NodeSocketGeometry')
+			instance_nodes.interface.new_socket('Geometry', in_out='OUTPUT', socket_type='NodeSocketGeometry')
+		input_node: NodeGroupInput = instance_nodes.nodes.new(type='NodeGroupInput')
+		input_node.location = (-400, 0)
+		output_node: NodeGroupOutput = instance_nodes.nodes.new(type='NodeGroupOutput')
+		output_node.location = (400, 0)
+		output_node.is_active_output = True
+		collection_node: GeometryNodeCollectionInfo = instance_nodes.nodes.new(type='GeometryNodeCollectionInfo')
+		collection_node.location = (-200, -100)
+		collection_node.transform_space = 'ORIGINAL'
+		collection_node.inputs['Collection'].default_value = mesh_obj
+		rotation_node: GeometryNodeInputNamedAttribute = instance_nodes.nodes.new(type='GeometryNodeInputNamedAttribute')
+		rotation_node.location = (-200, -300)
+		rotation_node.data_type = 'FLOAT_VECTOR'
+		rotation_node.inputs['Name'].default_value = 'psw_rotation'
+		scale_node: GeometryNodeInputNamedAttribute = instance_nodes.nodes.new(type='GeometryNodeInputNamedAttribute')
+		scale_node.location = (-200, -450)
+		scale_node.data_type = 'FLOAT_VECTOR'
+		scale_node.inputs['Name'].default_value = 'psw_scale'
+		instance_node: GeometryNodeInstanceOnPoints = instance_nodes.nodes.new(type='GeometryNodeInstanceOnPoints')
+		instance_node.location = (100, 0)
+		instance_nodes.links.new(input_node.outputs[0], instance_node.inputs['Points'])
+		instance_nodes.links.new(collection_node.outputs[0], instance_node.inputs['Instance'])
+		instance_nodes.links.new(rotation_node.outputs['Attribute'], instance_node.inputs['Rotation'])
+		instance_nodes.links.new(scale_node.outputs['Attribute'], instance_node.inputs['Scale'])
+		instance_nodes.links.new(instance_node.outputs[0], output_node.inputs[0])
+
+		instancer: Object = bpy.data.objects.new(name=name, object_data=points)
+		node_modifier: NodesModifier = instancer.modifiers.new('Actor Instances', type='NODES')
+		if node_modifier.node_group is not None:
+			bpy.data.node_groups.remove(node_modifier.node_group)
+		node_modifier.node_group = instance_nodes
+		return instancer
+
+	def get_actor_masks(self) -> tuple[ndarray, ndarray, ndarray]:
+		psw = self.psw
+		name_index = psw.ActorNameIndex
+		asset_index = psw.ActorAssetIndex
+
+		# every decision is made once per distinct name or asset and then spread over the actors using it.
+		skipped = ~psw.ActorIsStatic if self.no_skeletons else numpy.zeros(psw.NumActors, dtype=bool)
+		loads_asset = get_name_mask(psw.ActorAssetTable, lambda x: x != 'None')[asset_index] & ~skipped & self.import_mesh
+
+		hidden_shapes = numpy.zeros(psw.NumActors, dtype=bool)
+		if self.ignore_shapes:
+			test = lambda x: is_ignored_name(x, self.ignore_names)
+			hidden_shapes = get_name_mask(psw.ActorNameTable, test)[name_index] | (get_name_mask(psw.ActorAssetTable, test)[asset_index] & loads_asset)
+
+		hidden_lodactors = numpy.zeros(psw.NumActors, dtype=bool)
+		if self.ignore_lodactors:
+			hidden_lodactors = get_name_mask(psw.ActorNameTable, is_lodactor_or_hlod)[name_index] | (get_name_mask(psw.ActorAssetTable, is_lodactor_or_hlod)[asset_index] & loads_asset)
+
+		log_count('WORLD', 'actors hidden as shapes', hidden_shapes.sum())
+		log_count('WORLD', 'actors hidden as LOD actors', hidden_lodactors.sum())
+		log_count('WORLD', 'actors skipped because they are not static', skipped.sum())
+
+		return (hidden_shapes, hidden_lodactors, skipped)
+
+	def create_instance_batch(self, actor_ids: list[int], instance_plan: list[tuple[str, Collection | Object | None, bool] | None], instance_hidden: list[bool], actor_cache: list[Object | None], instance_collection: Collection):
+		instances = []
+		for actor_id in actor_ids:
+			(instance_name, mesh_obj, is_static) = instance_plan[actor_id]
+			if is_static or mesh_obj is None:
+				instance = bpy.data.objects.new(instance_name, None)
+
+				if mesh_obj is not None:
+					instance.instance_type = 'COLLECTION'
+					instance.instance_collection = mesh_obj
+			else:
+				instance = mesh_obj
 
-		name = basename(path)
-		if not '.' in name:
-			return None
+			actor_cache[actor_id] = instance
+			instances.append(instance)
+
+		actor_ids = numpy.array(actor_ids)
+		hidden = numpy.array(instance_hidden)[actor_ids]
+		transforms = {
+			'location': self.psw.ActorPositions[actor_ids],
+			'rotation_euler': quaternion_to_euler(self.psw.ActorRotations[actor_ids]),
+			'scale': self.psw.ActorScales[actor_ids],
+			'visible_shadow': ~self.psw.ActorNoShadow[actor_ids],
+			'hide_render': hidden,
+			'hide_viewport': hidden,
+			'show_instancer_for_render': ~hidden,
+		}
+
+		# link everything into a scratch collection so the transforms can be written with foreach_set,
+		# objects keep whatever other collections they are linked to when it's removed.
+		staging = bpy.data.collections.new(self.name + ' Staging')
+		for instance in instances:
+			staging.objects.link(instance)
+
+		if list(staging.objects) == instances:
+			for (key, values) in transforms.items():
+				staging.objects.foreach_set(key, values.ravel())
+		else:
+			for (index, instance) in enumerate(instances):
+				for (key, values) in transforms.items():
+					setattr(instance, key, values[index].tolist())
+
+		bpy.data.collections.remove(staging)
+
+		for (actor_id, instance) in zip(actor_ids.tolist(), instances):
+			if instance_plan[actor_id][2]:
+				instance_collection.objects.link(instance)
 
-		return self.try_find_umodel(join_path(dirname(path), name[:name.index('.')]))
+	def create_instances(self, instance_plan: list[tuple[str, Collection | Object | None, bool] | None], instance_hidden: list[bool], instance_collection: Collection) -> Generator[None, None, list[Object | None]]:
+		actor_cache: list[Object | None] = [None] * self.psw.NumActors
+		planned = [actor_id for (actor_id, plan) in enumerate(instance_plan) if plan is not None]
+		for start in range(0, len(planned), instance_batch_size):
+			batch = planned[start:start + instance_batch_size]
+			self.create_instance_batch(batch, instance_plan, instance_hidden, actor_cache, instance_collection)
+			self.steps_done += len(batch)
+			yield
+
+		# parents are only assigned once every actor has an object.
+		parents = self.psw.ActorParents.tolist()
+		for actor_id in planned:
+			parent = parents[actor_id]
+			if parent > -1:
+				actor_cache[actor_id].parent = actor_cache[parent]
+
+		self.steps_done += self.psw.NumActors - len(planned)
+		return actor_cache
+
+	@staticmethod
+	def count_datablocks() -> dict[str, int]:
+		return {
+			'objects': len(bpy.data.objects),
+			'meshes': len(bpy.data.meshes),
+			'materials': len(bpy.data.materials),
+			'images': len(bpy.data.images),
+			'lights': len(bpy.data.lights),
+			'collections': len(bpy.data.collections),
+			'node groups': len(bpy.data.node_groups),
+		}
+
+	def lap(self, profile: Profiler, name: str):
+		# the datablocks created since the previous lap are attributed to this phase.
+		profile.lap(name)
+		counts = self.count_datablocks()
+		profile.add_created(name, {key: count - self.datablock_counts.get(key, count) for (key, count) in counts.items()})
+		self.datablock_counts = counts
+
+	@property
+	def progress(self) -> float:
+		return min(1.0, self.steps_done / max(1, self.steps_total))
 
 	def execute(self, context: Context) -> set[str]:
+		steps = self.execute_steps(context)
+		while True:
+			try:
+				next(steps)
+			except StopIteration as e:
+				return e.value
+
+	def execute_steps(self, context: Context) -> Generator[None, None, set[str]]:
 		if self.psw is None:
 			return {'CANCELLED'}
 
 		if len(self.game_dir) == 0:
 			return {'CANCELLED'}
 
+		if self.write_log:
+			logger.configure(self.log_level, self.path + '.log.json')
+		else:
+			logger.configure(self.log_level)
+
+		# parsing already recorded its phases into the same profile, possibly on another thread.
+		profile = self.psw.Profile
+		set_profiler(profile)
+		profile.begin()
+		datablock_counts = self.count_datablocks()
+		self.datablock_counts = datablock_counts
+		material_hits = material_cache.hits
+		material_misses = material_cache.misses
+
+		self.assets = get_asset_index(self.game_dir)
+		self.lap(profile, 'asset index')
+
+		# context is only valid until the first yield, anything needed later is taken from it here.
+		view_layer = context.view_layer
+		self.steps_total = self.psw.NumActors * 2 + len(self.psw.LightActors) + len(self.psw.LandscapeNames)
+		self.steps_done = 0
+
 		world_collection = bpy.data.collections.new(self.name)
 		context.collection.children.link(world_collection)
-		world_layer = context.view_layer.active_layer_collection.children[-1]
+		world_layer = view_layer.active_layer_collection.children[-1]
 
 		actor_collection = bpy.data.collections.new(self.name + ' Actors')
 		instance_collection = bpy.data.collections.new(self.name + ' Actor Instances')
@@ -171,318 +584,406 @@ class World:
 		world_collection.children.link(spot_light_collection)
 		world_collection.children.link(area_light_collection)
 
-		old_active_layer = context.view_layer.active_layer_collection
-
-		mesh_cache: dict[tuple[str, frozenset], Collection] = {}
-
-		actor_cache: list[Collection] = [None] * self.psw.NumActors
-
-		material_cache = {}
-		for actor_id, (name, game_path, parent, pos, rot, scale, no_shadow, hidden, _, is_static, material_start, material_len) in enumerate(self.psw.Actors):
-			if self.ignore_shapes and is_ignored_name(name):
-				log_info('WORLD', "hiding model %s because it is a shape" % (name))
-				hidden = True
-			if self.ignore_lodactors and is_lodactor_or_hlod(name):
-				log_info('WORLD', "hiding model %s because it is a LOD Actor" % (name))
-				hidden = True
-
-			material_range = self.psw.Materials[material_start:material_start+material_len]
-			mesh_key = (game_path, frozenset([x[0] for x in material_range]))
-
-			skip_load = False
-			if self.no_skeletons and not is_static:
-				log_info('WORLD', "skipping model %s because it is not static" % (name))
-				skip_load = True
-
-			if self.no_static_instances:
-				is_static = False
-
-			mesh_obj = None
-			target_obj = None
-			if mesh_key in mesh_cache and is_static:
-				mesh_obj = mesh_cache[mesh_key]
-			elif game_path != 'None' and self.import_mesh and skip_load is False:
-				if self.ignore_shapes and is_ignored_name(game_path):
-					log_info('WORLD', "hiding model %s because it is a shape" % (game_path))
-					hidden = True
-				if self.ignore_lodactors and is_lodactor_or_hlod(game_path):
-					log_info('WORLD', "hiding model %s because it is a LOD actor" % (game_path))
-					hidden = True
-				result_path = game_path.strip('/').strip('\\')
-
-				if sep != '/':
-					result_path = result_path.replace('/', sep)
-
-				found = False
-				if enable_ueformat:
-					uemodel_path = self.try_find_umodel(result_path)
-					if uemodel_path is not None:
-						found = True
-						import_settings = UEModelOptions(link=True, scale_factor=self.resize_mod, bone_length=5, reorient_bones=False)
-						if is_static:
-							mesh_obj = bpy.data.collections.new(name)
-							actor_collection.children.link(mesh_obj)
-							context.view_layer.active_layer_collection = actor_layer.children[-1]
-							target_obj = UEFormatImport(import_settings).import_file(uemodel_path)
-							mesh_obj.name = undeduplicate_name(target_obj.name)
-							mesh_cache[mesh_key] = mesh_obj
-						else:
-							context.view_layer.active_layer_collection = instance_layer
-							mesh_obj = UEFormatImport(import_settings).import_file(uemodel_path)
-							target_obj = mesh_obj
-				if not found:
-					log_error('WORLD', 'Can\'t find asset %s' % result_path)
-					mesh_obj = None
-
-			instance_name = name
-
-			if mesh_obj is not None:
-				if not self.use_actor_name or instance_name.startswith('StaticMeshActor') or instance_name.startswith('SkeletalMeshActor'):
-					instance_name = undeduplicate_name(mesh_obj.name)
-				else:
-					instance_name = '%s %s' % (name, undeduplicate_name(mesh_obj.name))
-
-			if target_obj is not None:
-				material_index = 0
-				for (material_name, material_path) in material_range:
-					if material_name not in material_cache:
-						result_material_path = material_path.strip('/').strip('\\')
-						if sep != '/':
-							result_material_path = result_material_path.replace('/', sep)
-						result_material_path = self.try_find_material(result_material_path)
-						mat = None
-						if result_material_path is not None:
-							import_settings = self.settings.copy()
-							mat = CUEMaterial(result_material_path, import_settings).import_material()
-						material_cache[material_name] = mat
-					mat = material_cache[material_name]
-					if mat is not None:
-						try: bpy.data.objects[1].material_slots[material_index].material = mat
-						except: pass
-					material_index += 1
+		old_active_layer = view_layer.active_layer_collection
+		prefetcher = None
+
+		# an ESC, an error or a stale ID ends the import early, the scene is still left tidy.
+		try:
+			mesh_cache: dict[tuple[str, frozenset], Collection] = {}
+
+			# point instanced actors have no object of their own, so they can't be used as a parent.
+			use_points = self.instance_mode == 'POINTS'
+			point_candidates = None
+			point_instances: dict[tuple[str, frozenset], tuple[Collection, list[int]]] = {}
+			if use_points:
+				referenced = numpy.zeros(self.psw.NumActors, dtype=bool)
+				parents = self.psw.ActorParents
+				referenced[parents[parents >= 0]] = True
+				if self.import_light:
+					referenced[self.psw.LightActors] = True
+				if self.import_landscape:
+					referenced[numpy.maximum(self.psw.LandscapeActors, 0)] = True
+				point_candidates = ((parents < 0) & ~referenced).tolist()
+
+			self.lap(profile, 'setup')
+
+			# first pass imports meshes and decides what every actor becomes, the second creates the objects in bulk.
+			instance_plan: list[tuple[str, Collection | Object | None, bool] | None] = [None] * self.psw.NumActors
+			instance_hidden: list[bool] = [False] * self.psw.NumActors
+			(hidden_shapes, hidden_lodactors, skipped) = self.get_actor_masks()
+			selected = self.psw.select_actors(self.settings).tolist()
+			mesh_keys = self.plan_meshes(selected, skipped)
+			import_order = self.get_import_order(mesh_keys)
+			profile.count('model imports planned', len(import_order))
+			self.lap(profile, 'mesh plan')
+
+			# only materials of actors that load a mesh are resolved and parsed, a filtered import skips the rest of the map.
+			material_lookup: dict[str, Material | None] = {}
+			materials = self.psw.Materials
+			material_paths: dict[str, str | None] = {}
+			material_data: dict[str, dict | None] = {}
+			if self.import_mesh and enable_ueformat:
+				needed = set()
+				for mesh_key in set(mesh_keys):
+					if mesh_key is not None:
+						needed.update(mesh_key[1])
+				for (material_name, material_path) in materials:
+					if material_name in needed and material_name not in material_paths:
+						material_paths[material_name] = self.resolve_material(material_path)
+				material_data = preload_materials(x for x in material_paths.values() if x is not None)
+				# a material that failed to parse was already logged, it is skipped rather than read again.
+				for (material_name, material_path) in material_paths.items():
+					if material_path in material_data and material_data[material_path] is None:
+						material_paths[material_name] = None
+				self.lap(profile, 'material preload')
+
+			# .uemodel files are read on worker threads a bounded window ahead of the actor loop.
+			prefetcher = AssetPrefetcher(import_order)
+
+			# non-static actors get an object of their own, copied from the one import of each mesh wherever it landed.
+			object_cache: dict[tuple[str, frozenset], Object] = {}
+			actor_columns = zip(
+				self.psw.ActorNames,
+				mesh_keys,
+				self.psw.ActorNoShadow.tolist(),
+				(self.psw.ActorHidden | hidden_shapes | hidden_lodactors).tolist(),
+				self.psw.ActorIsStatic.tolist(),
+				self.psw.ActorMaterialStart.tolist(),
+				self.psw.ActorMaterialLen.tolist())
+			for actor_id, (name, mesh_key, no_shadow, hidden, is_static, material_start, material_len) in enumerate(actor_columns):
+				self.steps_done += 1
+				yield
+
+				if not selected[actor_id]:
+					continue
 
-			if is_static or mesh_obj is None:
-				instance = bpy.data.objects.new(instance_name, None)
+				material_range = materials[material_start:material_start+material_len]
+
+				if self.no_static_instances:
+					is_static = False
+
+				mesh_obj = None
+				target_obj = None
+				if mesh_key is None:
+					pass
+				elif is_static and mesh_key in mesh_cache:
+					mesh_obj = mesh_cache[mesh_key]
+					profile.count('mesh cache hits')
+				elif not is_static and mesh_key in object_cache:
+					mesh_obj = self.duplicate_object(object_cache[mesh_key], instance_collection)
+					profile.count('mesh copies')
+				elif is_static and mesh_key in object_cache:
+					# a non-static actor already imported this model, the collection is built from a copy of it.
+					mesh_obj = bpy.data.collections.new(name)
+					actor_collection.children.link(mesh_obj)
+					copy_obj = self.duplicate_object(object_cache[mesh_key], mesh_obj)
+					mesh_obj.name = undeduplicate_name(copy_obj.name)
+					mesh_cache[mesh_key] = mesh_obj
+					profile.count('mesh copies')
+				else:
+					uemodel_path = mesh_key[0]
+					import_settings = UEModelOptions(link=True, scale_factor=self.resize_mod, bone_length=5, reorient_bones=False)
+					if is_static:
+						mesh_obj = bpy.data.collections.new(name)
+						actor_collection.children.link(mesh_obj)
+						view_layer.active_layer_collection = actor_layer.children[-1]
+						with profile.phase('mesh read'):
+							data = prefetcher.get(uemodel_path)
+						with profile.phase('mesh import'):
+							target_obj = import_model(import_settings, uemodel_path, data)
+						mesh_obj.name = undeduplicate_name(target_obj.name)
+						mesh_cache[mesh_key] = mesh_obj
+						object_cache[mesh_key] = target_obj
+					else:
+						view_layer.active_layer_collection = instance_layer
+						with profile.phase('mesh read'):
+							data = prefetcher.get(uemodel_path)
+						with profile.phase('mesh import'):
+							mesh_obj = import_model(import_settings, uemodel_path, data)
+						target_obj = mesh_obj
+						if mesh_obj is not None:
+							object_cache[mesh_key] = mesh_obj
+
+				instance_name = name
 
 				if mesh_obj is not None:
-					instance.instance_type = 'COLLECTION'
-					instance.instance_collection = mesh_obj
-			else:
-				instance = mesh_obj
-
-			instance.location = pos
-			instance.rotation_mode = 'QUATERNION'
-			instance.rotation_quaternion = rot
-			instance.scale = scale
-
-			if no_shadow:
-				instance.visible_shadow = False
-
-			if hidden:
-				instance.hide_render = True
-				instance.hide_viewport = True
-				instance.show_instancer_for_render = False
-
-			if parent > -1:
-				instance.parent = actor_cache[parent]
-
-			actor_cache[actor_id] = instance
-
-			if is_static:
-				instance_collection.objects.link(instance)
-
-		actor_collection.hide_render = True
-		actor_collection.hide_viewport = True
-
-		if self.import_light:
-			for (actor_id, color, light_type, whl, attenuation, radius, temp, bias, lumens, angle) in self.psw.Lights:
-				light_type_bl = 'POINT'
-				if light_type == 0:
-					if self.adjust_sun_intensity <= 0.0001:
-						continue
-					light_type_bl = 'SUN'
-				elif light_type == 1:
-					if self.adjust_intensity <= 0.0001:
-						continue
-				elif light_type == 2:
-					if self.adjust_spot_intensity <= 0.0001:
-						continue
-					light_type_bl = 'SPOT'
-				elif light_type == 3:
-					if self.adjust_area_intensity <= 0.0001:
-						continue
-					light_type_bl = 'AREA'
-				actor = actor_cache[actor_id]
-				actor_data = self.psw.Actors[actor_id]
-				bl_light_data = bpy.data.lights.new(name=actor.name + '_light', type=light_type_bl)
-				bl_light_data.use_shadow = not actor_data[6]
-				bl_light_data.color = color
-				if actor_data[8]:
-					bl_light_data.color = convert_temperature(temp)
-					lumens = lumens * 100
-				bl_light_data.shadow_soft_size = bias
-				if light_type == 0:
-					bl_light_data.energy = lumens * self.adjust_sun_intensity
-				elif light_type == 1:
-					bl_light_data.energy = lumens * self.adjust_intensity
-				elif light_type == 2:
-					bl_light_data.energy = lumens * self.adjust_spot_intensity
-					bl_light_data.spot_size = angle
-				elif light_type == 3:
-					bl_light_data.energy = lumens * self.adjust_area_intensity
-					bl_light_data.shape = 'RECTANGLE'
-					bl_light_data.size = whl.x
-					bl_light_data.size_y = whl.y
-				bl_light_obj = bpy.data.objects.new(name=actor.name + '_light', object_data=bl_light_data)
-				bl_light_obj.parent = actor
-				bl_light_obj.rotation_mode = 'QUATERNION'
-				bl_light_obj.rotation_quaternion = Quaternion((0.707107, 0, -0.707107, 0))
-				if light_type == 0:
-					sun_light_collection.objects.link(bl_light_obj)
-				elif light_type == 1:
-					point_light_collection.objects.link(bl_light_obj)
-				elif light_type == 2:
-					spot_light_collection.objects.link(bl_light_obj)
-				elif light_type == 3:
-					area_light_collection.objects.link(bl_light_obj)
-
-		if self.import_landscape:
-			tiles: map[tuple[int, int], tuple[Object, Material, ShaderNodeTexCoord, set[str]]] = {}
-			for (tex_path, actor_id, pos, scale, type_id, tile_x, tile_y, bias, offset, dim) in self.psw.Landscapes:
-				result_path = tex_path.strip('/').strip('\\')
-				if not result_path.endswith('.png'):
-					result_path += '.png'
-				if sep != '/':
-					result_path = result_path.replace('/', sep)
-				result_path = normpath(join_path(self.game_dir, result_path))
-
-				if not exists(result_path):
-					log_error('WORLD', 'Can\'t find asset %s' % (tex_path))
+					if not self.use_actor_name or instance_name.startswith('StaticMeshActor') or instance_name.startswith('SkeletalMeshActor'):
+						instance_name = undeduplicate_name(mesh_obj.name)
+					else:
+						instance_name = '%s %s' % (name, undeduplicate_name(mesh_obj.name))
+
+				if target_obj is not None:
+					material_index = 0
+					for (material_name, material_path) in material_range:
+						if material_name not in material_lookup:
+							result_material_path = material_paths.get(material_name)
+							mat = None
+							if result_material_path is not None:
+								import_settings = self.settings.copy()
+								mat = import_cached_material(result_material_path, import_settings, self.assets, material_data.get(result_material_path))
+							material_lookup[material_name] = mat
+						mat = material_lookup[material_name]
+						if mat is not None:
+							try: bpy.data.objects[1].material_slots[material_index].material = mat
+							except: pass
+						material_index += 1
+
+				if use_points and is_static and mesh_obj is not None and point_candidates[actor_id] and not hidden and not no_shadow:
+					point_instances.setdefault(mesh_key, (mesh_obj, []))[1].append(actor_id)
 					continue
 
-				if type_id != 0:
-					if (tile_x, tile_y) not in tiles:
+				instance_plan[actor_id] = (instance_name, mesh_obj, is_static)
+				instance_hidden[actor_id] = hidden
+
+			prefetcher.close()
+			self.lap(profile, 'actors')
+			actor_cache = yield from self.create_instances(instance_plan, instance_hidden, instance_collection)
+			self.lap(profile, 'instances')
+
+			if len(point_instances) > 0:
+				eulers = quaternion_to_euler(self.psw.ActorRotations)
+				for (mesh_obj, actor_ids) in point_instances.values():
+					actor_ids = numpy.array(actor_ids)
+					instancer = self.create_point_instancer(mesh_obj, self.psw.ActorPositions[actor_ids], eulers[actor_ids], self.psw.ActorScales[actor_ids])
+					instance_collection.objects.link(instancer)
+				log_info('WORLD', 'instanced %d actors on points of %d objects' % (sum(len(x[1]) for x in point_instances.values()), len(point_instances)))
+				self.lap(profile, 'point instancers')
+
+			actor_collection.hide_render = True
+			actor_collection.hide_viewport = True
+
+			if self.import_light:
+				lights = self.get_light_parameters()
+				light_collections = (sun_light_collection, point_light_collection, spot_light_collection, area_light_collection)
+				light_groups = self.get_light_groups(lights) if self.share_light_data else numpy.arange(len(lights['actors']))
+				light_data_cache: dict[int, Light] = {}
+				light_count = 0
+				light_columns = zip(
+					light_groups.tolist(),
+					lights['actors'].tolist(),
+					lights['kinds'].tolist(),
+					lights['known'].tolist(),
+					lights['enabled'].tolist(),
+					lights['use_shadow'].tolist(),
+					lights['colors'].tolist(),
+					lights['energy'].tolist(),
+					lights['soft_size'].tolist(),
+					lights['spot_size'].tolist(),
+					lights['sizes'].tolist())
+				for (group, actor_id, kind, known, enabled, use_shadow, color, energy, soft_size, spot_size, size) in light_columns:
+					self.steps_done += 1
+					yield
+
+					if not enabled:
 						continue
-
-					(landscape_obj, material, tex_coord, tracking) = tiles[(tile_x, tile_y)]
-					if tex_path in tracking:
+					actor = actor_cache[actor_id]
+					if actor is None:
+						continue
+					bl_light_data = light_data_cache.get(group)
+					if bl_light_data is None:
+						bl_light_data = bpy.data.lights.new(name=actor.name + '_light', type=light_type_names[kind])
+						bl_light_data.use_shadow = use_shadow
+						bl_light_data.color = color
+						bl_light_data.shadow_soft_size = soft_size
+						if known:
+							bl_light_data.energy = energy
+						if kind == 2:
+							bl_light_data.spot_size = spot_size
+						elif kind == 3:
+							bl_light_data.shape = 'RECTANGLE'
+							bl_light_data.size = size[0]
+							bl_light_data.size_y = size[1]
+						light_data_cache[group] = bl_light_data
+					else:
+						profile.count('shared light data')
+					bl_light_obj = bpy.data.objects.new(name=actor.name + '_light', object_data=bl_light_data)
+					bl_light_obj.parent = actor
+					bl_light_obj.rotation_mode = 'QUATERNION'
+					bl_light_obj.rotation_quaternion = light_rotation
+					light_count += 1
+					if known:
+						light_collections[kind].objects.link(bl_light_obj)
+
+				if self.share_light_data:
+					log_info('WORLD', '%d lights share %d light datablocks' % (light_count, len(light_data_cache)))
+
+			self.lap(profile, 'lights')
+
+			if self.import_landscape:
+				tiles: map[tuple[int, int], tuple[Object, Material, ShaderNodeTexCoord, set[str]]] = {}
+				heightmaps: dict[str, ndarray] = {}
+				for (tex_path, actor_id, pos, scale, type_id, tile_x, tile_y, bias, offset, dim) in get_landscapes(self.psw):
+					self.steps_done += 1
+					yield
+
+					result_path = tex_path.strip('/').strip('\\')
+					if not result_path.endswith('.png'):
+						result_path += '.png'
+					if sep != '/':
+						result_path = result_path.replace('/', sep)
+					result_path = self.assets.resolve(result_path)
+
+					if result_path is None:
+						log_error('WORLD', 'Can\'t find asset %s' % (tex_path))
+						log_count('WORLD', 'landscape maps missing')
 						continue
-					tracking.add(tex_path)
-
-					material_data = landscape_obj.material_slots[0].material
-					node_tree = material_data.node_tree
 
-					# create nodes
-					image_node: ShaderNodeTexImage = node_tree.nodes.new(type='ShaderNodeTexImage')
-					image_node.image = bpy.data.images.load(filepath=result_path, check_existing=True)
-					image_node.image.colorspace_settings.name = 'Non-Color'
-					image_node.interpolation = 'Cubic'
-					image_node.extension = 'EXTEND'
-					image_node.location = tex_coord.location + Vector((240, -((type_id - 1) * 280)))
-					image_node.label = 'Weightmap%d' % (type_id - 1)
+					if type_id != 0:
+						if (tile_x, tile_y) not in tiles:
+							continue
 
-					separate_xyz: ShaderNodeSeparateXYZ = node_tree.nodes.new(type='ShaderNodeSeparateXYZ')
-					separate_xyz.location = image_node.location + Vector((360, 0))
+						(landscape_obj, material, tex_coord, tracking) = tiles[(tile_x, tile_y)]
+						if tex_path in tracking:
+							continue
+						tracking.add(tex_path)
 
-					reroute: NodeReroute = node_tree.nodes.new(type='NodeReroute')
-					reroute.location = separate_xyz.location + Vector((140, -160))
-					reroute.label = 'W'
+						material_data = landscape_obj.material_slots[0].material
+						node_tree = material_data.node_tree
 
-					# create links
-					node_tree.links.new(tex_coord.outputs['Generated'], image_node.inputs['Vector'])
-					node_tree.links.new(image_node.outputs['Color'], separate_xyz.inputs['Vector'])
-					node_tree.links.new(image_node.outputs['Alpha'], reroute.inputs[0])
+						# create nodes
+						image_node: ShaderNodeTexImage = node_tree.nodes.new(type='ShaderNodeTexImage')
+						image_node.image = bpy.data.images.load(filepath=result_path, check_existing=True)
+						image_node.image.colorspace_settings.name = 'Non-Color'
+						image_node.interpolation = 'Cubic'
+						image_node.extension = 'EXTEND'
+						image_node.location = tex_coord.location + Vector((240, -((type_id - 1) * 280)))
+						image_node.label = 'Weightmap%d' % (type_id - 1)
 
-					# todo: X, Y, Z, or W needs to be connected to the Invert Alpha node
+						separate_xyz: ShaderNodeSeparateXYZ = node_tree.nodes.new(type='ShaderNodeSeparateXYZ')
+						separate_xyz.location = image_node.location + Vector((360, 0))
 
-					continue
+						reroute: NodeReroute = node_tree.nodes.new(type='NodeReroute')
+						reroute.location = separate_xyz.location + Vector((140, -160))
+						reroute.label = 'W'
 
-				actor = actor_cache[0 if actor_id == -1 else actor_id]
-				landscape_name = actor.name + '_Sector%d_%d' % (tile_x, tile_y)
+						# create links
+						node_tree.links.new(tex_coord.outputs['Generated'], image_node.inputs['Vector'])
+						node_tree.links.new(image_node.outputs['Color'], separate_xyz.inputs['Vector'])
+						node_tree.links.new(image_node.outputs['Alpha'], reroute.inputs[0])
 
-				if offset > Vector((0.0, 0.0, 0.0)):
-					log_warning('WORLD', 'Off-center landscape: %s (%f, %f, %f)' % (landscape_name, offset.x, offset.y, offset.z))
+						# todo: X, Y, Z, or W needs to be connected to the Invert Alpha node
 
-					if self.skip_offcenter:
 						continue
 
-				base_scale = Vector((scale, scale, 255))
-				adj_scale = base_scale * dim
-				pos_offset = (adj_scale - base_scale) / 2
-				pos_offset.y *= -1
-				adj_pos = (pos + offset) + pos_offset
-				global_offset = ((scale + 1) / 2) - 1
-				adj_pos.x += global_offset
-				adj_pos.y -= global_offset
-				adj_pos.z = -bias / 1000
-
-				adj_scale *= self.resize_mod
-				adj_pos *= self.resize_mod
-
-				landscape_data: Mesh = bpy.data.meshes.new(landscape_name)
-				landscape_obj: Object = bpy.data.objects.new(name=landscape_data.name, object_data=landscape_data)
-				landscape_obj.parent = actor
-				landscape_obj.scale = adj_scale
-				landscape_obj.location = adj_pos
-
-				landscape_nodes: GeometryNodeTree = bpy.data.node_groups.new(landscape_obj.name, 'GeometryNodeTree')
-				if hasattr(landscape_nodes, 'outputs'):
-					landscape_nodes.outputs.new('NodeSocketGeometry')
-				elif hasattr(landscape_nodes, 'interface'):
-					landscape_nodes.interface.new_socket('Geometry', in_out='OUTPUT', socket_type='NodeSocketGeometry')
-				output_node: NodeGroupOutput = landscape_nodes.nodes.new(type='NodeGroupOutput')
-				output_node.location = (400, 0)
-				output_node.is_active_output = True
-				output_node.select = False
-				group_node: GeometryNodeGroup = landscape_nodes.nodes.new(type='GeometryNodeGroup')
-				group_node.node_tree = bpy.data.node_groups['PSW Height']
-				group_node.select = False
-				img: Image = bpy.data.images.load(filepath=result_path, check_existing=True)
-				img.colorspace_settings.name = 'Non-Color'
-				group_node.inputs['Dimensions'].default_value = dim
-				group_node.inputs['Heightmap'].default_value = img
-				landscape_nodes.links.new(group_node.outputs[0], output_node.inputs[0])
-
-				node_modifier: NodesModifier = landscape_obj.modifiers.new('Landscape Geometry', type='NODES')
-				if node_modifier.node_group is not None:
-					bpy.data.node_groups.remove(node_modifier.node_group)
-				node_modifier.node_group = landscape_nodes
-
-				landscape_collection.objects.link(landscape_obj)
-
-				material_data: Material = bpy.data.materials.get(landscape_data.name)
-
-				if material_data is None:
-					material_data = bpy.data.materials.new(landscape_data.name)
-					material_data.blend_method = 'HASHED'
-					material_data.use_nodes = True
-					bsdf = material_data.node_tree.nodes['Principled BSDF']
-					tex_coord = material_data.node_tree.nodes.new(type='ShaderNodeTexCoord')
-					tex_coord.location = bsdf.location + Vector((-1200, 0))
-					invert_color: ShaderNodeInvert = material_data.node_tree.nodes.new(type='ShaderNodeInvert')
-					invert_color.location = bsdf.location + Vector((-300, 0))
-					material_data.node_tree.links.new(invert_color.outputs['Color'], bsdf.inputs['Alpha'])
-
-				landscape_data.materials.append(material_data)
-				landscape_obj.material_slots[0].link = 'OBJECT'
-				landscape_obj.material_slots[0].material = material_data
-
-				tiles[(tile_x, tile_y)] = (landscape_obj, material_data, tex_coord, set())
-
-		context.view_layer.active_layer_collection = old_active_layer
-
-		collections = [
-			actor_collection,
-			instance_collection,
-			landscape_collection,
-			point_light_collection,
-			sun_light_collection,
-			spot_light_collection,
-			area_light_collection
-		]
-
-		for collection in collections:
-			if len(collection.all_objects) == 0:
-				world_collection.children.unlink(collection)
-
-		return {'FINISHED'}
+					actor = actor_cache[0 if actor_id == -1 else actor_id]
+					if actor is None:
+						continue
+					landscape_name = actor.name + '_Sector%d_%d' % (tile_x, tile_y)
+
+					if offset > Vector((0.0, 0.0, 0.0)):
+						log_warning('WORLD', 'Off-center landscape: %s (%f, %f, %f)' % (landscape_name, offset.x, offset.y, offset.z))
+
+						if self.skip_offcenter:
+							continue
+
+					base_scale = Vector((scale, scale, 255))
+					adj_scale = base_scale * dim
+					pos_offset = (adj_scale - base_scale) / 2
+					pos_offset.y *= -1
+					adj_pos = (pos + offset) + pos_offset
+					global_offset = ((scale + 1) / 2) - 1
+					adj_pos.x += global_offset
+					adj_pos.y -= global_offset
+					adj_pos.z = -bias / 1000
+
+					adj_scale *= self.resize_mod
+					adj_pos *= self.resize_mod
+
+					landscape_data: Mesh = bpy.data.meshes.new(landscape_name)
+					landscape_obj: Object = bpy.data.objects.new(name=landscape_data.name, object_data=landscape_data)
+					landscape_obj.parent = actor
+					landscape_obj.scale = adj_scale
+					landscape_obj.location = adj_pos
+
+					if self.landscape_mode == 'BAKE':
+						heightmap = heightmaps.get(result_path)
+						if heightmap is None:
+							heightmap = heightmaps[result_path] = self.load_heightmap(result_path)
+						vertices_x = max(2, int(dim.x * height_grid_density))
+						vertices_y = max(2, int(dim.y * height_grid_density))
+						self.fill_grid_mesh(landscape_data, bake_heightmap(heightmap, vertices_x, vertices_y), vertices_x, vertices_y)
+					else:
+						landscape_nodes: GeometryNodeTree = bpy.data.node_groups.new(landscape_obj.name, 'GeometryNodeTree')
+						if hasattr(landscape_nodes, 'outputs'):
+							landscape_nodes.outputs.new('NodeSocketGeometry')
+						elif hasattr(landscape_nodes, 'interface'):
+							landscape_nodes.interface.new_socket('Geometry', in_out='OUTPUT', socket_type='NodeSocketGeometry')
+						output_node: NodeGroupOutput = landscape_nodes.nodes.new(type='NodeGroupOutput')
+						output_node.location = (400, 0)
+						output_node.is_active_output = True
+						output_node.select = False
+						group_node: GeometryNodeGroup = landscape_nodes.nodes.new(type='GeometryNodeGroup')
+						group_node.node_tree = bpy.data.node_groups['PSW Height']
+						group_node.select = False
+						img: Image = bpy.data.images.load(filepath=result_path, check_existing=True)
+						img.colorspace_settings.name = 'Non-Color'
+						group_node.inputs['Dimensions'].default_value = dim
+						group_node.inputs['Heightmap'].default_value = img
+						landscape_nodes.links.new(group_node.outputs[0], output_node.inputs[0])
+
+						node_modifier: NodesModifier = landscape_obj.modifiers.new('Landscape Geometry', type='NODES')
+						if node_modifier.node_group is not None:
+							bpy.data.node_groups.remove(node_modifier.node_group)
+						node_modifier.node_group = landscape_nodes
+
+					landscape_collection.objects.link(landscape_obj)
+
+					material_data: Material = bpy.data.materials.get(landscape_data.name)
+
+					if material_data is None:
+						material_data = bpy.data.materials.new(landscape_data.name)
+						material_data.blend_method = 'HASHED'
+						material_data.use_nodes = True
+						bsdf = material_data.node_tree.nodes['Principled BSDF']
+						tex_coord = material_data.node_tree.nodes.new(type='ShaderNodeTexCoord')
+						tex_coord.location = bsdf.location + Vector((-1200, 0))
+						invert_color: ShaderNodeInvert = material_data.node_tree.nodes.new(type='ShaderNodeInvert')
+						invert_color.location = bsdf.location + Vector((-300, 0))
+						material_data.node_tree.links.new(invert_color.outputs['Color'], bsdf.inputs['Alpha'])
+
+					landscape_data.materials.append(material_data)
+					landscape_obj.material_slots[0].link = 'OBJECT'
+					landscape_obj.material_slots[0].material = material_data
+
+					tiles[(tile_x, tile_y)] = (landscape_obj, material_data, tex_coord, set())
+
+			self.lap(profile, 'landscapes')
+
+			profile.count('actors', self.psw.NumActors)
+			profile.count('actors selected', sum(selected))
+			profile.count('material cache hits', material_cache.hits - material_hits)
+			profile.count('material cache misses', material_cache.misses - material_misses)
+			for (key, count) in self.count_datablocks().items():
+				profile.count('new ' + key, count - datablock_counts[key])
+			if self.write_profile:
+				profile.write(self.path + '.profile.json', {'file': self.path, 'incremental': self.settings.get('incremental', False)})
+
+			log_info('WORLD', 'material cache: %d hits, %d misses this session' % (material_cache.hits, material_cache.misses))
+			log_summary()
+			if self.write_log:
+				logger.close()
+
+			return {'FINISHED'}
+		finally:
+			if prefetcher is not None:
+				prefetcher.close()
+
+			try:
+				view_layer.active_layer_collection = old_active_layer
+
+				collections = [
+					actor_collection,
+					instance_collection,
+					landscape_collection,
+					point_light_collection,
+					sun_light_collection,
+					spot_light_collection,
+					area_light_collection
+				]
+
+				for collection in collections:
+					if len(collection.all_objects) == 0:
+						world_collection.children.unlink(collection)
+			except ReferenceError:
+				# undo or a file load freed the collections underneath the import.
+				pass
@@ -1,33 +1,132 @@
+import os
 import typing
+from glob import glob
+from hashlib import blake2b, sha1
+from mmap import mmap, ACCESS_READ
 from struct import unpack
+from sys import intern
+from time import perf_counter
 
 import numpy
-from bpy.types import Property
-from io_import_psw.utils import fix_string_np, fix_string, log_error
-from mathutils import Quaternion, Vector, Color
+from io_import_psw.utils import Profiler, fix_string_np, fix_strings_np, fix_string, get_cache_dir, log_error, log_info, log_warning
 from numpy import dtype, ndarray
 from numpy.typing import DTypeLike
 
 
-dispatch: dict[str, DTypeLike] = {
-		'WORLDACTORS::3': dtype([('name', '256b'), ('asset', '256b'), ('parent', 'i'), ('pos', '3f'), ('rot', '4f'), ('scale', '3f'), ('flags', 'i'), ('material_start', 'i'), ('material_len', 'i')]),
-		'WORLDACTORS::2': dtype([('name', '256b'), ('asset', '256b'), ('parent', 'i'), ('pos', '3f'), ('rot', '4f'), ('scale', '3f'), ('flags', 'i')]),
-		'WORLDACTORS':  dtype([('name', '64b'), ('asset', '256b'), ('parent', 'i'), ('pos', '3f'), ('rot', '4f'), ('scale', '3f'), ('flags', 'i')]),
-		'WORLDLIGHTS':  dtype([('parent', 'i'), ('color', '4B'), ('type', 'i'), ('whl', '3f'), ('attenuation', 'f'), ('radius', 'f'), ('temp', 'f'), ('bias', 'f'), ('lumens', 'f'), ('angle', 'f')]),
-		'LANDSCAPE':    dtype([('name', '256b'), ('actor_id', 'i'), ('x', 'i'), ('y', 'i'), ('type', 'i'), ('size', 'i'), ('bias', 'i'), ('offset', '2f'), ('dim', '2i')]),
-		'INSTMATERIAL::2': dtype([('actor_id', 'i'), ('material_id', 'i'), ('name', '256b')]),
-		'INSTMATERIAL': dtype([('actor_id', 'i'), ('material_id', 'i'), ('name', '64b')]),
-		'ACTORMATERIALS': dtype([('name', '256b'), ('asset', '256b')]),
-}
+class SpatialGrid:
+	origin: ndarray  # float64[3]
+	cell_size: float
+	dims: ndarray  # int64[3]
+	keys: ndarray  # int64[n], sorted cell keys
+	order: ndarray  # int64[n], point index for each entry in keys
+	positions: ndarray
+
+	def __init__(self, positions: ndarray, points_per_cell: int = 8):
+		self.positions = positions
+		if len(positions) == 0:
+			self.origin = numpy.zeros(3)
+			self.cell_size = 1.0
+			self.dims = numpy.ones(3, dtype=numpy.int64)
+			self.keys = numpy.empty(0, dtype=numpy.int64)
+			self.order = numpy.empty(0, dtype=numpy.int64)
+			return
+
+		self.origin = positions.min(axis=0).astype(numpy.float64)
+		extent = float((positions.max(axis=0) - self.origin).max())
+		self.cell_size = max(extent / max(1.0, numpy.cbrt(len(positions) / points_per_cell)), 1e-6)
+		cells = self.get_cells(positions)
+		self.dims = cells.max(axis=0) + 1
+		keys = self.get_keys(cells)
+		self.order = numpy.argsort(keys, kind='stable')
+		self.keys = keys[self.order]
+
+	def get_cells(self, positions: ndarray) -> ndarray:
+		return numpy.floor((positions - self.origin) / self.cell_size).astype(numpy.int64)
+
+	def get_keys(self, cells: ndarray) -> ndarray:
+		return (cells[..., 0] * self.dims[1] + cells[..., 1]) * self.dims[2] + cells[..., 2]
+
+	def query_box(self, box_min: typing.Sequence[float], box_max: typing.Sequence[float]) -> ndarray:
+		(box_min, box_max) = (numpy.minimum(box_min, box_max), numpy.maximum(box_min, box_max))
+		cell_min = numpy.maximum(self.get_cells(box_min), 0)
+		cell_max = numpy.minimum(self.get_cells(box_max), self.dims - 1)
+		if len(self.keys) == 0 or (cell_max < cell_min).any():
+			return numpy.empty(0, dtype=numpy.int64)
+
+		if numpy.prod(cell_max - cell_min + 1) > len(self.keys):
+			candidates = numpy.arange(len(self.positions))
+		else:
+			ranges = numpy.meshgrid(*[numpy.arange(lo, hi + 1) for (lo, hi) in zip(cell_min, cell_max)], indexing='ij')
+			cell_keys = self.get_keys(numpy.stack(ranges, axis=-1).reshape(-1, 3))
+			starts = numpy.searchsorted(self.keys, cell_keys, side='left')
+			ends = numpy.searchsorted(self.keys, cell_keys, side='right')
+			candidates = numpy.concatenate([self.order[start:end] for (start, end) in zip(starts.tolist(), ends.tolist()) if end > start] or [numpy.empty(0, dtype=numpy.int64)])
+
+		points = self.positions[candidates]
+		inside = ((points >= box_min) & (points <= box_max)).all(axis=1)
+		return numpy.sort(candidates[inside])
+
+	def query_radius(self, center: typing.Sequence[float], radius: float) -> ndarray:
+		center = numpy.asarray(center, dtype=numpy.float64)
+		candidates = self.query_box(center - radius, center + radius)
+		distance = ((self.positions[candidates] - center) ** 2).sum(axis=1)
+		return candidates[distance <= radius * radius]
+
+
+def quaternion_to_matrix(rotations: ndarray) -> ndarray:
+	(w, x, y, z) = rotations.astype(numpy.float64).T
+	return numpy.stack((
+		numpy.stack((1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)), axis=-1),
+		numpy.stack((2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)), axis=-1),
+		numpy.stack((2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)), axis=-1),
+	), axis=1)
 
 
 class World:
+	Profile: Profiler
 	NumActors: int
+	Scale: float  # resize_by already applied to ActorPositions and LightSizes
+
+	ActorNameTable: list[str]
+	ActorNameIndex: ndarray  # int32[n], into ActorNameTable
+	ActorAssetTable: list[str]
+	ActorAssetIndex: ndarray  # int32[n], into ActorAssetTable
+	ActorParents: ndarray  # int32[n]
+	ActorPositions: ndarray  # float32[n, 3], scaled
+	ActorRotations: ndarray  # float32[n, 4], wxyz
+	ActorScales: ndarray  # float32[n, 3]
+	ActorFlags: ndarray  # int32[n]
+	ActorNoShadow: ndarray  # bool[n]
+	ActorHidden: ndarray  # bool[n]
+	ActorUseTemp: ndarray  # bool[n]
+	ActorIsStatic: ndarray  # bool[n]
+	ActorMaterialStart: ndarray  # int32[n]
+	ActorMaterialLen: ndarray  # int32[n]
+
+	LightActors: ndarray  # int32[n]
+	LightColors: ndarray  # float32[n, 3]
+	LightTypes: ndarray  # int32[n]
+	LightSizes: ndarray  # float32[n, 3], scaled
+	LightAttenuation: ndarray
+	LightRadius: ndarray
+	LightTemperature: ndarray
+	LightBias: ndarray
+	LightLumens: ndarray
+	LightAngle: ndarray
+
+	MaterialNameTable: list[str]
+	MaterialNameIndex: ndarray  # int32[n], into MaterialNameTable
+	MaterialAssetTable: list[str]
+	MaterialAssetIndex: ndarray  # int32[n], into MaterialAssetTable
 
-	Actors: list[tuple[str, str, int, Vector, Quaternion, Vector, bool, bool, bool, bool, int, int]]  # bools = no shadow, hidden, use_temp, is_static
-	Lights: list[tuple[int, Color, int, Vector, float, float, float, float, float, float]]
-	Materials: list[tuple[str, str]]
-	Landscapes: list[tuple[str, int, Vector, int, int, int, int, float, Vector, Vector]]  # name, actor, pos, size, type, x, y, bias, offset, dim
+	LandscapeNames: list[str]
+	LandscapeActors: ndarray  # int32[n]
+	LandscapeTiles: ndarray  # int32[n, 2], x y
+	LandscapeSizes: ndarray  # int32[n]
+	LandscapeTypes: ndarray  # int32[n]
+	LandscapeBias: ndarray  # int32[n]
+	LandscapeOffsets: ndarray  # float32[n, 2]
+	LandscapeDims: ndarray  # int32[n, 2]
 
 	NPActors: ndarray
 	NPLights: ndarray
@@ -35,13 +134,60 @@ class World:
 	NPLandscapes: ndarray | None
 	NPActorsVer: int
 
+	cached_columns = (
+		'ActorNameIndex', 'ActorAssetIndex', 'ActorParents', 'ActorPositions', 'ActorRotations', 'ActorScales', 'ActorFlags',
+		'ActorNoShadow', 'ActorHidden', 'ActorUseTemp', 'ActorIsStatic', 'ActorMaterialStart', 'ActorMaterialLen',
+		'LightActors', 'LightColors', 'LightTypes', 'LightSizes', 'LightAttenuation', 'LightRadius', 'LightTemperature', 'LightBias', 'LightLumens', 'LightAngle',
+		'MaterialNameIndex', 'MaterialAssetIndex',
+		'LandscapeActors', 'LandscapeTiles', 'LandscapeSizes', 'LandscapeTypes', 'LandscapeBias', 'LandscapeOffsets', 'LandscapeDims',
+	)
+	cached_tables = ('ActorNameTable', 'ActorAssetTable', 'MaterialNameTable', 'MaterialAssetTable', 'LandscapeNames')
+
 	def __init__(self):
+		self.Profile = Profiler()
 		self.NumActors = 0
+		self.Scale = 1.0
+
+		self.ActorNameTable = []
+		self.ActorNameIndex = numpy.empty(0, dtype=numpy.int32)
+		self.ActorAssetTable = []
+		self.ActorAssetIndex = numpy.empty(0, dtype=numpy.int32)
+		self.ActorParents = numpy.empty(0, dtype=numpy.int32)
+		self.ActorPositions = numpy.empty((0, 3), dtype=numpy.float32)
+		self.ActorRotations = numpy.empty((0, 4), dtype=numpy.float32)
+		self.ActorScales = numpy.empty((0, 3), dtype=numpy.float32)
+		self.ActorFlags = numpy.empty(0, dtype=numpy.int32)
+		self.ActorNoShadow = numpy.empty(0, dtype=bool)
+		self.ActorHidden = numpy.empty(0, dtype=bool)
+		self.ActorUseTemp = numpy.empty(0, dtype=bool)
+		self.ActorIsStatic = numpy.empty(0, dtype=bool)
+		self.ActorMaterialStart = numpy.empty(0, dtype=numpy.int32)
+		self.ActorMaterialLen = numpy.empty(0, dtype=numpy.int32)
+
+		self.LightActors = numpy.empty(0, dtype=numpy.int32)
+		self.LightColors = numpy.empty((0, 3), dtype=numpy.float32)
+		self.LightTypes = numpy.empty(0, dtype=numpy.int32)
+		self.LightSizes = numpy.empty((0, 3), dtype=numpy.float32)
+		self.LightAttenuation = numpy.empty(0, dtype=numpy.float32)
+		self.LightRadius = numpy.empty(0, dtype=numpy.float32)
+		self.LightTemperature = numpy.empty(0, dtype=numpy.float32)
+		self.LightBias = numpy.empty(0, dtype=numpy.float32)
+		self.LightLumens = numpy.empty(0, dtype=numpy.float32)
+		self.LightAngle = numpy.empty(0, dtype=numpy.float32)
+
+		self.MaterialNameTable = []
+		self.MaterialNameIndex = numpy.empty(0, dtype=numpy.int32)
+		self.MaterialAssetTable = []
+		self.MaterialAssetIndex = numpy.empty(0, dtype=numpy.int32)
 
-		self.Actors = []
-		self.Lights = []
-		self.Materials = []
-		self.Landscapes = []
+		self.LandscapeNames = []
+		self.LandscapeActors = numpy.empty(0, dtype=numpy.int32)
+		self.LandscapeTiles = numpy.empty((0, 2), dtype=numpy.int32)
+		self.LandscapeSizes = numpy.empty(0, dtype=numpy.int32)
+		self.LandscapeTypes = numpy.empty(0, dtype=numpy.int32)
+		self.LandscapeBias = numpy.empty(0, dtype=numpy.int32)
+		self.LandscapeOffsets = numpy.empty((0, 2), dtype=numpy.float32)
+		self.LandscapeDims = numpy.empty((0, 2), dtype=numpy.int32)
 
 		self.NPActors = None
 		self.NPLights = None
@@ -49,76 +195,441 @@ class World:
 		self.NPLandscapes = None
 		self.NPActorsVer = 0
 
+		self._spatial_index = None
+
 	def __setitem__(self, key: str, value: ndarray):
-		if key == 'WORLDACTORS' or key == 'WORLDACTORS::2' or key == 'WORLDACTORS::3':
-			self.NPActorsVer = 1 if key == 'WORLDACTORS::3' else 0
-			self.NPActors = value
-		elif key == 'WORLDLIGHTS':
-			self.NPLights = value
-		elif key == 'INSTMATERIAL' or key == 'INSTMATERIAL::2':
-			pass
-		elif key == 'ACTORMATERIALS':
-			self.NPMaterials = value
-		elif key == 'LANDSCAPE':
-			self.NPLandscapes = value
-		else:
+		parser = dispatch.get(key)
+		if parser is None:
 			log_error('PSW', 'Unhandled chunk %s' % (key))
+		elif parser.handler is not None:
+			parser.handler(self, value)
+
+	def set_actors(self, value: ndarray):
+		self.NPActorsVer = 1 if 'material_start' in value.dtype.names else 0
+		self.NPActors = value
+
+	def set_lights(self, value: ndarray):
+		self.NPLights = value
+
+	def set_materials(self, value: ndarray):
+		self.NPMaterials = value
+
+	def set_landscapes(self, value: ndarray):
+		self.NPLandscapes = value
+
+	@property
+	def ActorNames(self) -> list[str]:
+		return [self.ActorNameTable[x] for x in self.ActorNameIndex.tolist()]
+
+	@property
+	def ActorAssets(self) -> list[str]:
+		return [self.ActorAssetTable[x] for x in self.ActorAssetIndex.tolist()]
 
-	def finalize(self, settings: dict[str, Property]):
+	@property
+	def MaterialNames(self) -> list[str]:
+		return [self.MaterialNameTable[x] for x in self.MaterialNameIndex.tolist()]
+
+	@property
+	def MaterialAssets(self) -> list[str]:
+		return [self.MaterialAssetTable[x] for x in self.MaterialAssetIndex.tolist()]
+
+	@property
+	def Materials(self) -> list[tuple[str, str]]:
+		return list(zip(self.MaterialNames, self.MaterialAssets))
+
+	def get_world_positions(self) -> ndarray:
+		# actor transforms are relative to their parent, walk down the hierarchy one level at a time.
+		count = self.NumActors
+		parents = numpy.where((self.ActorParents >= 0) & (self.ActorParents < count), self.ActorParents, -1)
+		local_basis = quaternion_to_matrix(self.ActorRotations) * self.ActorScales.astype(numpy.float64)[:, numpy.newaxis, :]
+		basis = local_basis.copy()
+		positions = self.ActorPositions.astype(numpy.float64)
+		resolved = parents < 0
+		while not resolved.all():
+			ready = ~resolved & resolved[numpy.maximum(parents, 0)]
+			if not ready.any():
+				break  # cyclic parents, leave them relative
+			ready_parents = parents[ready]
+			positions[ready] = positions[ready_parents] + numpy.einsum('nij,nj->ni', basis[ready_parents], positions[ready])
+			basis[ready] = basis[ready_parents] @ local_basis[ready]
+			resolved |= ready
+		return positions
+
+	def get_spatial_index(self) -> SpatialGrid:
+		if self._spatial_index is None:
+			self._spatial_index = SpatialGrid(self.get_world_positions())
+		return self._spatial_index
+
+	def with_parents(self, mask: ndarray) -> ndarray:
+		mask = mask.copy()
+		parents = self.ActorParents
+		pending = mask.copy()
+		while pending.any():
+			ancestors = parents[pending]
+			ancestors = ancestors[(ancestors >= 0) & (ancestors < self.NumActors)]
+			pending = numpy.zeros_like(mask)
+			pending[ancestors[~mask[ancestors]]] = True
+			mask |= pending
+		return mask
+
+	def select_actors(self, settings: dict[str, typing.Any]) -> ndarray:
+		mode = settings.get('filter_mode', 'NONE')
+		if mode == 'NONE' or self.NumActors == 0:
+			return numpy.ones(self.NumActors, dtype=bool)
+
+		if mode == 'BOX':
+			inside = self.get_spatial_index().query_box(settings['filter_min'], settings['filter_max'])
+		else:
+			inside = self.get_spatial_index().query_radius(settings['filter_center'], settings['filter_radius'])
+
+		mask = numpy.zeros(self.NumActors, dtype=bool)
+		mask[inside] = True
+		return self.with_parents(mask)
+
+	def finalize(self, settings: dict[str, typing.Any]):
+		with self.Profile.phase('finalize'):
+			self.decode()
+			self.apply_settings(settings)
+
+	def apply_settings(self, settings: dict[str, typing.Any]):
 		resize_by: float = settings['resize_by'] if 'resize_by' in settings else 0.01
+		if resize_by == self.Scale:
+			return
+
+		factor = numpy.float32(resize_by / self.Scale)
+		self.ActorPositions = self.ActorPositions * factor
+		self.LightSizes = self.LightSizes * factor
+		self.Scale = resize_by
+
+		self._spatial_index = None
+
+	def decode(self):
+		self.Scale = 1.0
+
+		self._spatial_index = None
 
 		if self.NPActors is not None and len(self.NPActors) > 0:
-			self.NumActors = len(self.NPActors)
+			actors = self.NPActors
+			self.NumActors = len(actors)
+			(self.ActorNameTable, self.ActorNameIndex) = fix_strings_np(actors['name'])
+			(self.ActorAssetTable, self.ActorAssetIndex) = fix_strings_np(actors['asset'])
+			self.ActorParents = actors['parent'].astype(numpy.int32)
+			self.ActorPositions = actors['pos'].copy()
+			self.ActorRotations = actors['rot'][:, [3, 0, 1, 2]]
+			self.ActorScales = actors['scale'].copy()
 			"""
-			x[6] =
+			flags =
 				1 = NoShadow
 				2 = Hidden
 				4 = UseTemperature
 				8 = IsSkeleton
 			"""
-			self.Actors = [(fix_string_np(x[0]), fix_string_np(x[1]), int(x[2]), Vector(x[3]) * resize_by, Quaternion((x[4][3], x[4][0], x[4][1], x[4][2])), Vector(x[5]), x[6] & 1 == 1, x[6] & 2 == 2, x[6] & 4 == 4, x[6] & 8 == 0, x[7] if self.NPActorsVer >= 1 else 0, x[8] if self.NPActorsVer >= 1 else 0) for x in self.NPActors]
+			self.ActorFlags = actors['flags'].astype(numpy.int32)
+			self.ActorNoShadow = (self.ActorFlags & 1) != 0
+			self.ActorHidden = (self.ActorFlags & 2) != 0
+			self.ActorUseTemp = (self.ActorFlags & 4) != 0
+			self.ActorIsStatic = (self.ActorFlags & 8) == 0
+			if self.NPActorsVer >= 1:
+				self.ActorMaterialStart = actors['material_start'].astype(numpy.int32)
+				self.ActorMaterialLen = actors['material_len'].astype(numpy.int32)
+			else:
+				self.ActorMaterialStart = numpy.zeros(self.NumActors, dtype=numpy.int32)
+				self.ActorMaterialLen = numpy.zeros(self.NumActors, dtype=numpy.int32)
 
 			if self.NPLights is not None and len(self.NPLights) > 0:
-				self.Lights = [(x['parent'], Color((x['color'][0] / 255, x['color'][1] / 255, x['color'][2] / 255)), int(x['type']), Vector(x['whl']) * resize_by, x['attenuation'], x['radius'], x['temp'], x['bias'], x['lumens'], x['angle']) for x in self.NPLights]
+				lights = self.NPLights
+				self.LightActors = lights['parent'].astype(numpy.int32)
+				self.LightColors = lights['color'][:, :3] / numpy.float32(255)
+				self.LightTypes = lights['type'].astype(numpy.int32)
+				self.LightSizes = lights['whl'].copy()
+				self.LightAttenuation = lights['attenuation']
+				self.LightRadius = lights['radius']
+				self.LightTemperature = lights['temp']
+				self.LightBias = lights['bias']
+				self.LightLumens = lights['lumens']
+				self.LightAngle = lights['angle']
 
 			if self.NPMaterials is not None and len(self.NPMaterials) > 0:
-				self.Materials = [(fix_string_np(x['name']), fix_string_np(x['asset'])) for x in self.NPMaterials]
+				(self.MaterialNameTable, self.MaterialNameIndex) = fix_strings_np(self.NPMaterials['name'])
+				(self.MaterialAssetTable, self.MaterialAssetIndex) = fix_strings_np(self.NPMaterials['asset'])
 
 		if self.NPLandscapes is not None and len(self.NPLandscapes) > 0:
-			self.Landscapes = [(fix_string_np(x['name']), x['actor_id'], Vector((x['x'], -x['y'], 0)), int(x['size']), x['type'], x['x'], x['y'], x['bias'], Vector((x['offset'][0], x['offset'][1], 0.0)), Vector((x['dim'][0], x['dim'][1], 1.0))) for x in self.NPLandscapes]
+			landscapes = self.NPLandscapes
+			self.LandscapeNames = [fix_string_np(x) for x in landscapes['name']]
+			self.LandscapeActors = landscapes['actor_id'].astype(numpy.int32)
+			self.LandscapeTiles = numpy.stack((landscapes['x'], landscapes['y']), axis=1).astype(numpy.int32)
+			self.LandscapeSizes = landscapes['size'].astype(numpy.int32)
+			self.LandscapeTypes = landscapes['type'].astype(numpy.int32)
+			self.LandscapeBias = landscapes['bias'].astype(numpy.int32)
+			self.LandscapeOffsets = landscapes['offset'].astype(numpy.float32)
+			self.LandscapeDims = landscapes['dim'].astype(numpy.int32)
+
+
+class ChunkParser(typing.NamedTuple):
+	family: str
+	version: int
+	dtype: dtype
+	handler: typing.Callable[[World, ndarray], None] | None  # None = recognized but ignored
+
+
+class ChunkInfo(typing.NamedTuple):
+	id: str
+	type: int
+	size: int
+	count: int
+	offset: int  # start of the chunk data, after the 32 byte header
+
+	@property
+	def family(self) -> str:
+		return chunk_family(self.id)
+
 
+def chunk_family(chunk_id: str) -> str:
+	return chunk_id.split('::')[0]
 
-def read_chunk(stream: typing.BinaryIO) -> tuple[ndarray | None, str]:
-	(chunk_id, chunk_type, chunk_size, chunk_count) = unpack('20s3i', stream.read(32))
-	chunk_id = fix_string(chunk_id)
-	total_size = chunk_size * chunk_count
 
-	for chunk_key in dispatch.keys():
-		if chunk_key == chunk_id or chunk_id.startswith(chunk_key):
-			return (numpy.fromfile(stream, dtype=dispatch[chunk_key], count=chunk_count), chunk_id)
+def chunk_version(chunk_id: str) -> int:
+	(_, _, version) = chunk_id.partition('::')
+	return int(version) if version.isdigit() else 1
 
-	log_error('PSW', 'No parser found for %s!' % (chunk_id))
 
-	stream.seek(total_size, 1)
+dispatch: dict[str, ChunkParser] = {}
 
-	return (None, chunk_id)
 
+def register_chunk(chunk_id: str, chunk_dtype: DTypeLike, handler: typing.Callable[[World, ndarray], None] | None) -> ChunkParser:
+	parser = ChunkParser(chunk_family(chunk_id), chunk_version(chunk_id), dtype(chunk_dtype), handler)
+	dispatch[chunk_id] = parser
+	return parser
+
+
+register_chunk('WORLDACTORS::3', [('name', '256b'), ('asset', '256b'), ('parent', 'i'), ('pos', '3f'), ('rot', '4f'), ('scale', '3f'), ('flags', 'i'), ('material_start', 'i'), ('material_len', 'i')], World.set_actors)
+register_chunk('WORLDACTORS::2', [('name', '256b'), ('asset', '256b'), ('parent', 'i'), ('pos', '3f'), ('rot', '4f'), ('scale', '3f'), ('flags', 'i')], World.set_actors)
+register_chunk('WORLDACTORS', [('name', '64b'), ('asset', '256b'), ('parent', 'i'), ('pos', '3f'), ('rot', '4f'), ('scale', '3f'), ('flags', 'i')], World.set_actors)
+register_chunk('WORLDLIGHTS', [('parent', 'i'), ('color', '4B'), ('type', 'i'), ('whl', '3f'), ('attenuation', 'f'), ('radius', 'f'), ('temp', 'f'), ('bias', 'f'), ('lumens', 'f'), ('angle', 'f')], World.set_lights)
+register_chunk('LANDSCAPE', [('name', '256b'), ('actor_id', 'i'), ('x', 'i'), ('y', 'i'), ('type', 'i'), ('size', 'i'), ('bias', 'i'), ('offset', '2f'), ('dim', '2i')], World.set_landscapes)
+register_chunk('INSTMATERIAL::2', [('actor_id', 'i'), ('material_id', 'i'), ('name', '256b')], None)
+register_chunk('INSTMATERIAL', [('actor_id', 'i'), ('material_id', 'i'), ('name', '64b')], None)
+register_chunk('ACTORMATERIALS', [('name', '256b'), ('asset', '256b')], World.set_materials)
+
+
+def find_chunk_parser(chunk: ChunkInfo) -> ChunkParser | None:
+	parser = dispatch.get(chunk.id)
+	if parser is None:
+		if any(x.family == chunk.family for x in dispatch.values()):
+			log_error('PSW', 'Unsupported version %d of chunk %s!' % (chunk_version(chunk.id), chunk.family))
+		else:
+			log_error('PSW', 'No parser found for %s!' % (chunk.id))
+		return None
 
-def read_file(stream: typing.BinaryIO, settings: dict[str, Property]) -> World | None:
-	ob = None
+	if chunk.size != parser.dtype.itemsize:
+		log_error('PSW', 'Chunk %s has an entry size of %d, expected %d!' % (chunk.id, chunk.size, parser.dtype.itemsize))
+		return None
+
+	return parser
+
+
+def required_chunks(settings: dict[str, typing.Any]) -> set[str]:
+	families = {'WORLDACTORS'}
+	if settings.get('import_mesh', True):
+		families.update(('ACTORMATERIALS', 'INSTMATERIAL'))
+	if settings.get('import_light', True):
+		families.add('WORLDLIGHTS')
+	if settings.get('import_landscape', True):
+		families.add('LANDSCAPE')
+	return families
+
+
+def read_toc(stream: typing.BinaryIO) -> list[ChunkInfo] | None:
+	stream.seek(0, 0)
 	magic = fix_string(unpack('20s', stream.read(20))[0])
-	if magic == 'WRLDHEAD':
-		ob = World()
-	else:
+	if magic != 'WRLDHEAD':
 		return None
+
 	stream.seek(0, 2)
 	size = stream.tell()
-	stream.seek(32, 0)
-	while stream.tell() < size:
-		(data, name) = read_chunk(stream)
-		if data is not None:
-			ob[name] = data
+	offset = 32
+	toc = []
+	while offset + 32 <= size:
+		stream.seek(offset, 0)
+		(chunk_id, chunk_type, chunk_size, chunk_count) = unpack('20s3i', stream.read(32))
+		offset += 32
+		if chunk_size < 0 or chunk_count < 0:
+			log_error('PSW', 'Chunk %s has a corrupt header, stopping!' % (fix_string(chunk_id)))
+			break
+		toc.append(ChunkInfo(fix_string(chunk_id), chunk_type, chunk_size, chunk_count, offset))
+		offset += chunk_size * chunk_count
+	return toc
+
+
+def read_chunk(stream: typing.BinaryIO, chunk: ChunkInfo) -> ndarray | None:
+	parser = find_chunk_parser(chunk)
+	if parser is None:
+		return None
+
+	# read() works for any binary stream, fromfile needs a real file descriptor.
+	stream.seek(chunk.offset, 0)
+	buffer = stream.read(chunk.size * chunk.count)
+	if len(buffer) != chunk.size * chunk.count:
+		log_error('PSW', 'Chunk %s is truncated!' % (chunk.id))
+		return None
+
+	return numpy.frombuffer(buffer, dtype=parser.dtype, count=chunk.count)
+
+
+def read_chunk_view(view: mmap, chunk: ChunkInfo) -> ndarray | None:
+	parser = find_chunk_parser(chunk)
+	if parser is None:
+		return None
+
+	if chunk.offset + chunk.size * chunk.count > len(view):
+		log_error('PSW', 'Chunk %s is truncated!' % (chunk.id))
+		return None
+
+	return numpy.frombuffer(view, dtype=parser.dtype, count=chunk.count, offset=chunk.offset)
+
+
+def map_file(stream: typing.BinaryIO) -> mmap | None:
+	try:
+		return mmap(stream.fileno(), 0, access=ACCESS_READ)
+	except (AttributeError, OSError, ValueError):
+		return None
+
+
+def read_file(stream: typing.BinaryIO, settings: dict[str, typing.Any], toc: list[ChunkInfo] | None = None, families: set[str] | None = None) -> World | None:
+	if toc is None:
+		toc = read_toc(stream)
+		if toc is None:
+			return None
+
+	ob = World()
+	if families is None:
+		families = required_chunks(settings)
+	known_families = set(x.family for x in dispatch.values())
+
+	with ob.Profile.phase('read_file'):
+		# chunks become views into the mapping, the mapping stays alive for as long as any of them do.
+		view = map_file(stream) if settings.get('use_mmap', True) else None
+		for chunk in toc:
+			# only known chunks the settings don't need are skipped, unknown ones are still reported by find_chunk_parser.
+			if chunk.family in known_families and chunk.family not in families:
+				continue
+
+			data = read_chunk_view(view, chunk) if view is not None else read_chunk(stream, chunk)
+			if data is not None:
+				ob[chunk.id] = data
 
 	ob.finalize(settings)
 
 	return ob
+
+
+cache_version = 1
+cache_limit = 64
+cache_sample_size = 0x10000
+
+
+def get_cache_path(path: str) -> str:
+	return os.path.join(get_cache_dir(), 'world-%s.npz' % sha1(os.path.normcase(os.path.abspath(path)).encode('utf8')).hexdigest())
+
+
+def get_cache_key(stream: typing.BinaryIO, path: str, toc: list[ChunkInfo]) -> str:
+	stat = os.stat(path)
+	# hashing the whole file would cost as much as parsing it, so hash the chunk headers and a few samples.
+	digest = blake2b(digest_size=16)
+	for chunk in toc:
+		digest.update(('%s:%d:%d:%d:%d;' % chunk).encode('utf8'))
+	for offset in sorted({0, max(stat.st_size // 2 - cache_sample_size, 0), max(stat.st_size - cache_sample_size, 0)}):
+		stream.seek(offset, 0)
+		digest.update(stream.read(cache_sample_size))
+	return '%s:%d:%d:%s' % (os.path.normcase(os.path.abspath(path)), stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+
+
+def pack_strings(table: list[str]) -> tuple[ndarray, ndarray]:
+	encoded = [x.encode('utf8') for x in table]
+	offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+	offsets[1:] = numpy.cumsum([len(x) for x in encoded])
+	return (numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8), offsets)
+
+
+def unpack_strings(data: ndarray, offsets: ndarray) -> list[str]:
+	raw = data.tobytes()
+	offsets = offsets.tolist()
+	return [intern(raw[start:end].decode('utf8')) for (start, end) in zip(offsets[:-1], offsets[1:])]
+
+
+def save_cache(ob: World, path: str, key: str):
+	arrays = {'version': numpy.array(cache_version), 'key': numpy.array(key), 'num_actors': numpy.array(ob.NumActors), 'scale': numpy.array(ob.Scale)}
+	for column in World.cached_columns:
+		arrays[column] = getattr(ob, column)
+	for table in World.cached_tables:
+		(arrays[table], arrays[table + '_offsets']) = pack_strings(getattr(ob, table))
+
+	cache_path = get_cache_path(path)
+	try:
+		with open(cache_path + '.tmp', 'wb') as stream:
+			numpy.savez(stream, **arrays)
+		os.replace(cache_path + '.tmp', cache_path)
+	except OSError as e:
+		log_warning('PSW', 'Could not write parse cache: %s' % e)
+		return
+
+	# other imports prune the same directory, entries can disappear between the glob and the stat.
+	cache_files = []
+	for cache_file in glob(os.path.join(get_cache_dir(), 'world-*.npz')):
+		try:
+			cache_files.append((os.path.getmtime(cache_file), cache_file))
+		except OSError:
+			pass
+
+	cache_files.sort(reverse=True)
+	for (_, old_path) in cache_files[cache_limit:]:
+		try:
+			os.remove(old_path)
+		except OSError:
+			pass
+
+
+def load_cache(path: str, key: str) -> World | None:
+	try:
+		with numpy.load(get_cache_path(path)) as data:
+			if int(data['version']) != cache_version or str(data['key']) != key:
+				return None
+
+			ob = World()
+			ob.NumActors = int(data['num_actors'])
+			ob.Scale = float(data['scale'])
+			for column in World.cached_columns:
+				setattr(ob, column, data[column])
+			for table in World.cached_tables:
+				setattr(ob, table, unpack_strings(data[table], data[table + '_offsets']))
+			return ob
+	except (OSError, ValueError, KeyError):
+		return None
+
+
+def load_file(path: str, settings: dict[str, typing.Any]) -> World | None:
+	with open(path, 'rb') as stream:
+		if not settings.get('use_parse_cache', True):
+			return read_file(stream, settings)
+
+		toc = read_toc(stream)
+		if toc is None:
+			return None
+
+		start = perf_counter()
+		key = get_cache_key(stream, path, toc)
+		ob = load_cache(path, key)
+		if ob is not None:
+			log_info('PSW', 'Loaded %s from the parse cache' % path)
+			ob.Profile.add('parse cache', perf_counter() - start)
+			ob.Profile.count('parse cache hits')
+			ob.apply_settings(settings)
+			return ob
+
+		# the cache has to hold every chunk, not just the ones the current settings need.
+		ob = read_file(stream, settings, toc, set(x.family for x in dispatch.values()))
+		if ob is not None:
+			ob.Profile.count('parse cache misses')
+			with ob.Profile.phase('parse cache'):
+				save_cache(ob, path, key)
+		return ob
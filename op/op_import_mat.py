@@ -4,6 +4,7 @@ import bpy
 from bpy.props import StringProperty, CollectionProperty, FloatProperty
 from bpy.types import Operator, Context, Property, OperatorFileListElement, TOPBAR_MT_file_import
 from bpy_extras.io_utils import ImportHelper
+from io_import_psw.assets import get_asset_index
 from io_import_psw.blend.mat import CUEMaterial
 from io_import_psw.utils import find_root_from_path
 
@@ -45,14 +46,15 @@ class op_import_mat(Operator, ImportHelper):
 		import os
 
 		settings: dict[str, Property] = self.as_keywords()
+		assets = get_asset_index(self.base_game_dir)
 
 		if self.files:
 			dirname = os.path.dirname(self.filepath)
 			ret = {'CANCELLED'}
 			for file in self.files:
 				path = os.path.join(dirname, file.name)
-				if CUEMaterial(path, settings).execute(context) == {'FINISHED'}:
+				if CUEMaterial(path, settings, assets).execute(context) == {'FINISHED'}:
 					ret = {'FINISHED'}
 			return ret
 		else:
-			return CUEMaterial(self.filepath, settings).execute(context)
+			return CUEMaterial(self.filepath, settings, assets).execute(context)
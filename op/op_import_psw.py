@@ -1,14 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 from typing import Union, Set
 from os.path import sep
 import os.path
+import traceback
 
 import bpy
-from bpy.props import CollectionProperty, FloatProperty, StringProperty, BoolProperty
+from bpy.props import CollectionProperty, FloatProperty, FloatVectorProperty, StringProperty, BoolProperty, EnumProperty
 from bpy.types import Operator, Context, Property, OperatorFileListElement, TOPBAR_MT_file_import
 from bpy_extras.io_utils import ImportHelper
-from io_import_psw.blend.psw import World
+from io_import_psw.blend.psw import World, ignore_names, load_world
 from io_import_psw.blend import nodes
-from io_import_psw.utils import find_root_from_path
+from io_import_psw.utils import find_root_from_path, logger, log_summary
 
 
 class op_import_psw(Operator, ImportHelper):
@@ -63,6 +66,22 @@ class op_import_psw(Operator, ImportHelper):
 			soft_max=10.0
 	)
 
+	share_light_data: BoolProperty(
+			name='Share Light Data',
+			description='Lights with identical type, color, energy, radius and shape use one light datablock',
+			default=False
+	)
+
+	landscape_mode: EnumProperty(
+			name='Landscape',
+			description='How landscape heightmaps become geometry',
+			items=(
+				('NODES', 'Geometry Nodes', 'Displace a grid with a geometry nodes tree per tile, evaluated on every update'),
+				('BAKE', 'Baked Mesh', 'Sample each heightmap once on import and store the grid as a static mesh'),
+			),
+			default='NODES'
+	)
+
 	skip_offcenter: BoolProperty(
 			name='Skip Invalid Tiles',
 			description='Skips landscapes that are offset',
@@ -93,6 +112,16 @@ class op_import_psw(Operator, ImportHelper):
 			default=False
 	)
 
+	instance_mode: EnumProperty(
+			name='Instancing',
+			description='How static actors that share a mesh are instanced',
+			items=(
+				('OBJECT', 'Objects', 'Create one collection instance object per actor'),
+				('POINTS', 'Points', 'Instance actors on the points of one geometry nodes object per mesh\nActors that are parents, hidden or without shadows still get their own object'),
+			),
+			default='OBJECT'
+	)
+
 	no_skeletons: BoolProperty(
 			name='No Skeletons',
 			description='Skip actors with skeletons\nWARNING: May significantly increase load times and memory usage when disabled.',
@@ -105,6 +134,12 @@ class op_import_psw(Operator, ImportHelper):
 			default=True
 	)
 
+	ignore_names: StringProperty(
+			name='Shape Names',
+			description='Comma separated mesh names treated as primitive shapes, SM_, Shape_ and 1M_ prefixes are stripped before comparing',
+			default=','.join(ignore_names)
+	)
+
 	ignore_lodactors: BoolProperty(
 			name='Ignore LOD Actors',
 			description='Ignore lod actors when enabled.',
@@ -117,6 +152,95 @@ class op_import_psw(Operator, ImportHelper):
 			default=True
 	)
 
+	filter_mode: EnumProperty(
+			name='Region',
+			description='Only import actors inside a region, along with the actors they are parented to',
+			items=(
+				('NONE', 'Everything', 'Import every actor'),
+				('BOX', 'Box', 'Import actors inside an axis aligned box'),
+				('RADIUS', 'Radius', 'Import actors within a distance of a point'),
+			),
+			default='NONE'
+	)
+
+	filter_min: FloatVectorProperty(
+			name='Box Min',
+			description='Minimum corner of the region, after scaling',
+			size=3,
+			subtype='XYZ'
+	)
+
+	filter_max: FloatVectorProperty(
+			name='Box Max',
+			description='Maximum corner of the region, after scaling',
+			size=3,
+			subtype='XYZ'
+	)
+
+	filter_center: FloatVectorProperty(
+			name='Center',
+			description='Center of the region, after scaling',
+			size=3,
+			subtype='XYZ'
+	)
+
+	filter_radius: FloatProperty(
+			name='Radius',
+			description='Radius of the region, after scaling',
+			default=100.0,
+			min=0.0
+	)
+
+	use_mmap: BoolProperty(
+			name='Memory Map Files',
+			description='Read chunks directly from a memory mapped file instead of copying them',
+			default=True
+	)
+
+	use_parse_cache: BoolProperty(
+			name='Cache Parsed Files',
+			description='Keep parsed worlds on disk so importing the same file again skips parsing',
+			default=True
+	)
+
+	incremental: BoolProperty(
+			name='Incremental Import',
+			description='Build the world in small batches while keeping Blender responsive, press Esc to stop',
+			default=False
+	)
+
+	batch_time: FloatProperty(
+			name='Batch Time',
+			description='Seconds spent building per update when importing incrementally',
+			default=0.1,
+			min=0.01,
+			soft_max=1.0
+	)
+
+	log_level: EnumProperty(
+			name='Log Level',
+			description='Least severe messages printed to the console',
+			items=(
+				('DEBUG', 'Debug', ''),
+				('INFO', 'Info', ''),
+				('WARNING', 'Warning', ''),
+				('ERROR', 'Error', ''),
+			),
+			default='INFO'
+	)
+
+	write_log: BoolProperty(
+			name='Write Log File',
+			description='Write every message and the summary counters as JSON lines next to the .psw file',
+			default=False
+	)
+
+	write_profile: BoolProperty(
+			name='Write Profile',
+			description='Write per-phase timings, cache hit rates and object counts as JSON next to the .psw file',
+			default=False
+	)
+
 	base_game_dir: StringProperty(
 			name='Asset Directory',
 			description='If empty will try to walk directories to find it',
@@ -138,12 +262,31 @@ class op_import_psw(Operator, ImportHelper):
 		layout.prop(self, 'adjust_area_intensity')
 		layout.prop(self, 'adjust_spot_intensity')
 		layout.prop(self, 'adjust_sun_intensity')
+		layout.prop(self, 'share_light_data')
+		layout.prop(self, 'landscape_mode')
 		layout.prop(self, 'skip_offcenter')
 		layout.prop(self, 'no_static_instances')
+		layout.prop(self, 'instance_mode')
 		layout.prop(self, 'no_skeletons')
 		layout.prop(self, 'ignore_shapes')
+		if self.ignore_shapes:
+			layout.prop(self, 'ignore_names')
 		layout.prop(self, 'ignore_lodactors')
 		layout.prop(self, 'use_actor_name')
+		layout.prop(self, 'filter_mode')
+		if self.filter_mode == 'BOX':
+			layout.prop(self, 'filter_min')
+			layout.prop(self, 'filter_max')
+		elif self.filter_mode == 'RADIUS':
+			layout.prop(self, 'filter_center')
+			layout.prop(self, 'filter_radius')
+		layout.prop(self, 'use_mmap')
+		layout.prop(self, 'use_parse_cache')
+		layout.prop(self, 'incremental')
+		layout.prop(self, 'batch_time')
+		layout.prop(self, 'log_level')
+		layout.prop(self, 'write_log')
+		layout.prop(self, 'write_profile')
 		layout.prop(self, 'base_game_dir')
 
 	def execute(self, context: Context) -> Union[Set[str], Set[int]]:
@@ -159,13 +302,102 @@ class op_import_psw(Operator, ImportHelper):
 
 		settings: dict[str, Property] = self.as_keywords()
 
+		if self.incremental:
+			paths = [os.path.join(os.path.dirname(self.filepath), file.name) for file in self.files] if self.files else [self.filepath]
+			return self.begin_incremental(context, paths, settings)
+
 		if self.files:
 			dirname = os.path.dirname(self.filepath)
+			paths = [os.path.join(dirname, file.name) for file in self.files]
 			ret = {'CANCELLED'}
-			for file in self.files:
-				path = os.path.join(dirname, file.name)
-				if World(path, settings).execute(context) == {'FINISHED'}:
-					ret = {'FINISHED'}
+			# parsing doesn't touch bpy, so every file is read in the background while earlier ones are being built.
+			with ThreadPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+				pending = [pool.submit(load_world, path, settings) for path in paths]
+				for path in paths:
+					psw = pending.pop(0).result()
+					if World(path, settings, psw).execute(context) == {'FINISHED'}:
+						ret = {'FINISHED'}
 			return ret
 		else:
 			return World(self.filepath, settings).execute(context)
+
+
+	def begin_incremental(self, context: Context, paths: list[str], settings: dict[str, Property]) -> Set[str]:
+		import os
+
+		self._paths = paths
+		self._settings = settings
+		self._pool = ThreadPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1))
+		self._pending = [self._pool.submit(load_world, path, settings) for path in paths]
+		self._index = 0
+		self._world = None
+		self._steps = None
+		self._result = {'CANCELLED'}
+
+		wm = context.window_manager
+		self._timer = wm.event_timer_add(0.01, window=context.window)
+		wm.progress_begin(0, 1000)
+		wm.modal_handler_add(self)
+		return {'RUNNING_MODAL'}
+
+	def end_incremental(self, context: Context):
+		if self._steps is not None:
+			self._steps.close()
+			self._steps = None
+			log_summary()
+			logger.close()
+		self._pool.shutdown(wait=False, cancel_futures=True)
+
+		wm = context.window_manager
+		wm.event_timer_remove(self._timer)
+		wm.progress_end()
+
+	def modal(self, context: Context, event) -> Set[str]:
+		if event.type == 'ESC':
+			self.end_incremental(context)
+			self.report({'WARNING'}, 'Import cancelled after %d of %d files' % (self._index, len(self._paths)))
+			return {'CANCELLED'}
+
+		if event.type != 'TIMER':
+			return {'PASS_THROUGH'}
+
+		# keep stepping until this tick's time budget is used up, then give the UI a chance to redraw.
+		deadline = perf_counter() + self.batch_time
+		try:
+			while perf_counter() < deadline:
+				if self._steps is None:
+					if self._index >= len(self._paths):
+						self.end_incremental(context)
+						return self._result
+
+					future = self._pending[self._index]
+					if not future.done():
+						break
+
+					self._world = World(self._paths[self._index], self._settings, future.result())
+					self._pending[self._index] = None
+					self._steps = self._world.execute_steps(context)
+
+				try:
+					next(self._steps)
+				except StopIteration as e:
+					if e.value == {'FINISHED'}:
+						self._result = {'FINISHED'}
+					self._steps = None
+					self._world = None
+					self._index += 1
+		except ReferenceError:
+			# undo or loading a file while the import runs frees the IDs it was building on.
+			self.end_incremental(context)
+			self.report({'WARNING'}, 'Import stopped after %d of %d files, the scene changed underneath it' % (self._index, len(self._paths)))
+			return {'CANCELLED'}
+		except Exception as e:
+			# anything escaping modal() would leave the timer and progress bar running.
+			traceback.print_exc()
+			self.end_incremental(context)
+			self.report({'ERROR'}, 'Import of %s failed: %s' % (os.path.basename(self._paths[self._index]), e))
+			return {'CANCELLED'}
+
+		progress = self._index + (self._world.progress if self._world is not None else 0.0)
+		context.window_manager.progress_update(int(1000 * progress / len(self._paths)))
+		return {'RUNNING_MODAL'}
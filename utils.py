@@ -1,27 +1,86 @@
-from bpy.types import Context, Object
+from collections import OrderedDict
+from contextlib import contextmanager
 from glob import glob
 from numpy import ndarray
 from os.path import sep
 from pathlib import Path
-import bpy
+from sys import intern
+from tempfile import gettempdir
+from threading import Lock
+from time import monotonic, perf_counter, time
+from typing import TextIO
+import json
 import numpy
 import os.path
 
 
+root_cache: OrderedDict[str, tuple[str, str, int]] = OrderedDict()  # directory -> (root, root file, root file mtime)
+root_cache_size = 256
+
+
+def get_cached_root(directory: str) -> tuple[str, str, int] | None:
+	cached = root_cache.get(directory)
+	if cached is None:
+		return None
+
+	(_, root_file, mtime) = cached
+	try:
+		if os.stat(root_file).st_mtime_ns == mtime:
+			root_cache.move_to_end(directory)
+			return cached
+	except OSError:
+		pass
+
+	del root_cache[directory]
+	return None
+
+
 def find_root_from_path(path: str):
 	current_path = Path(path).parent.absolute()
+	visited = []
 	while True:
-		root_files = glob(str(current_path) + sep + "*.root")
+		directory = str(current_path)
+		cached = get_cached_root(directory)
+		if cached is not None:
+			break
+
+		visited.append(directory)
+		root_files = glob(directory + sep + "*.root")
 		if len(root_files) == 1:
-			log_info('PSW', "Found root path %s" % str(current_path))
-			if os.path.exists(f"{str(current_path)}/Content"):
+			log_info('PSW', "Found root path %s" % directory)
+			root = directory
+			if os.path.exists(f"{directory}/Content"):
 				log_info('PSW', "Root is modern layout")
-				return str(current_path) + '/Content'
-			return str(current_path)
+				root = directory + '/Content'
+			cached = (root, root_files[0], os.stat(root_files[0]).st_mtime_ns)
+			break
 		if current_path.parent == current_path:
 			return None
 		current_path = current_path.parent
 
+	# every directory walked through resolves to the same root, so siblings and children skip the walk.
+	for directory in visited:
+		root_cache[directory] = cached
+		root_cache.move_to_end(directory)
+	while len(root_cache) > root_cache_size:
+		root_cache.popitem(last=False)
+
+	return cached[0]
+
+
+cache_dir: str | None = None  # None keeps the cache in the system temp directory
+
+
+def get_cache_dir() -> str:
+	path = cache_dir if cache_dir is not None else os.path.join(gettempdir(), 'io_import_psw')
+	os.makedirs(path, exist_ok=True)
+	return path
+
+
+def set_cache_dir(path: str | None):
+	global cache_dir
+	cache_dir = path
+
 
 def fix_string(string: str) -> str:
 	return string.rstrip(b'\0').decode(errors='replace', encoding='utf8')
@@ -30,17 +89,207 @@ def fix_string(string: str) -> str:
 def fix_string_np(string: ndarray) -> str:
 	return numpy.trim_zeros(string).tobytes().decode(errors='replace', encoding='utf8')
 
+
+def fix_strings_np(strings: ndarray) -> tuple[list[str], ndarray]:
+	if len(strings) == 0:
+		return ([], numpy.empty(0, dtype=numpy.int32))
+	# view each fixed-width row as one bytes scalar so every distinct value is decoded exactly once.
+	raw = numpy.ascontiguousarray(strings).view('S%d' % strings.shape[1]).reshape(-1)
+	(table, index) = numpy.unique(raw, return_inverse=True)
+	return ([intern(x.decode(errors='replace', encoding='utf8')) for x in table.tolist()], index.reshape(-1).astype(numpy.int32))
+
 INFO = u"\u001b[35m"
 ERROR = u"\u001b[31m"
 WARNING = u"\u001b[33m"
 RESET = u"\u001b[0m"
 
+log_levels = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+log_colors = {'DEBUG': RESET, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR}
+
+
+class Logger:
+	level: int
+	rate_limit: int  # DEBUG and INFO console lines per category per window
+	rate_window: float  # seconds
+	counters: dict[tuple[str, str], int]
+	suppressed: dict[str, int]
+	windows: dict[str, tuple[float, int]]  # category -> (window start, lines printed)
+	log_file: TextIO | None
+
+	def __init__(self):
+		self.level = log_levels['INFO']
+		self.rate_limit = 20
+		self.rate_window = 5.0
+		self.counters = {}
+		self.suppressed = {}
+		self.windows = {}
+		self.log_file = None
+		self.lock = Lock()
+
+	def configure(self, level: str = 'INFO', log_path: str | None = None):
+		with self.lock:
+			self.level = log_levels.get(level, log_levels['INFO'])
+			if self.log_file is not None:
+				self.log_file.close()
+				self.log_file = None
+			if log_path is not None:
+				try:
+					self.log_file = open(log_path, 'w', encoding='utf8')
+				except OSError as e:
+					print(f'{WARNING}[LOG]{RESET} Could not open log file {log_path}: {e}')
+
+	def write_record(self, record: dict):
+		if self.log_file is not None:
+			self.log_file.write(json.dumps(record) + '\n')
+
+	def log(self, level: str, category: str, message: str):
+		with self.lock:
+			self.write_record({'time': time(), 'level': level, 'category': category, 'message': message})
+			if log_levels[level] < self.level:
+				return
+
+			# warnings and errors always reach the console, only the chatty levels are throttled.
+			if log_levels[level] < log_levels['WARNING']:
+				now = monotonic()
+				(window_start, printed) = self.windows.get(category, (now, 0))
+				if now - window_start > self.rate_window:
+					(window_start, printed) = (now, 0)
+				if printed >= self.rate_limit:
+					self.suppressed[category] = self.suppressed.get(category, 0) + 1
+					self.windows[category] = (window_start, printed)
+					return
+				self.windows[category] = (window_start, printed + 1)
+
+		print(f'{log_colors[level]}[{category}]{RESET} {message}')
+
+	def count(self, category: str, key: str, amount: int = 1):
+		if amount == 0:
+			return
+		with self.lock:
+			self.counters[(category, key)] = self.counters.get((category, key), 0) + int(amount)
+
+	def summary(self):
+		with self.lock:
+			counters = self.counters
+			suppressed = self.suppressed
+			self.counters = {}
+			self.suppressed = {}
+			self.windows = {}
+			for ((category, key), amount) in counters.items():
+				self.write_record({'time': time(), 'level': 'SUMMARY', 'category': category, 'message': key, 'count': amount})
+			if self.log_file is not None:
+				self.log_file.flush()
+
+		for ((category, key), amount) in sorted(counters.items()):
+			print(f'{INFO}[{category}]{RESET} {amount:,} {key}')
+		for (category, amount) in sorted(suppressed.items()):
+			print(f'{INFO}[{category}]{RESET} {amount:,} more messages were not printed')
+
+	def close(self):
+		with self.lock:
+			if self.log_file is not None:
+				self.log_file.close()
+				self.log_file = None
+
+
+logger = Logger()
+
+
 def log_info(category: str, message: str):
-	print(f'{INFO}[{category}]{RESET} {message}')
+	logger.log('INFO', category, message)
 
 
 def log_error(category: str, message: str):
-	print(f'{ERROR}[{category}]{RESET} {message}')
+	logger.log('ERROR', category, message)
+
 
 def log_warning(category: str, message: str):
-	print(f'{WARNING}[{category}]{RESET} {message}')
+	logger.log('WARNING', category, message)
+
+
+def log_debug(category: str, message: str):
+	logger.log('DEBUG', category, message)
+
+
+def log_count(category: str, key: str, amount: int = 1):
+	logger.count(category, key, amount)
+
+
+def log_summary():
+	logger.summary()
+
+
+class Profiler:
+	phases: dict[str, list[float | int]]  # name -> [seconds, calls]
+	counters: dict[str, int]
+	created: dict[str, dict[str, int]]  # phase -> datablock type -> datablocks created
+
+	def __init__(self):
+		self.phases = {}
+		self.counters = {}
+		self.created = {}
+		self.lock = Lock()
+		self.last_lap = perf_counter()
+
+	def add(self, name: str, elapsed: float):
+		with self.lock:
+			entry = self.phases.setdefault(name, [0.0, 0])
+			entry[0] += elapsed
+			entry[1] += 1
+
+	# lap timing is for generators, a with block can't stay open across a yield without also timing the caller.
+	def begin(self):
+		self.last_lap = perf_counter()
+
+	def lap(self, name: str):
+		now = perf_counter()
+		self.add(name, now - self.last_lap)
+		self.last_lap = now
+
+	@contextmanager
+	def phase(self, name: str):
+		start = perf_counter()
+		try:
+			yield
+		finally:
+			self.add(name, perf_counter() - start)
+
+	def count(self, name: str, amount: int = 1):
+		with self.lock:
+			self.counters[name] = self.counters.get(name, 0) + int(amount)
+
+	def add_created(self, name: str, created: dict[str, int]):
+		with self.lock:
+			entry = self.created.setdefault(name, {})
+			for (key, amount) in created.items():
+				if amount != 0:
+					entry[key] = entry.get(key, 0) + int(amount)
+
+	def report(self) -> dict:
+		with self.lock:
+			return {
+				'phases': {name: {'time': seconds, 'calls': calls, 'created': dict(self.created.get(name, {}))} for (name, (seconds, calls)) in self.phases.items()},
+				'counters': dict(self.counters),
+			}
+
+	def write(self, path: str, extra: dict | None = None):
+		report = self.report()
+		if extra is not None:
+			report.update(extra)
+		try:
+			with open(path, 'w', encoding='utf8') as stream:
+				json.dump(report, stream, indent='\t')
+		except OSError as e:
+			log_warning('PROFILE', 'Could not write profile %s: %s' % (path, e))
+
+
+active_profiler = Profiler()
+
+
+def get_profiler() -> Profiler:
+	return active_profiler
+
+
+def set_profiler(profiler: Profiler):
+	global active_profiler
+	active_profiler = profiler